@@ -0,0 +1,66 @@
+"""
+Time and peak memory of the dedup / latest-opportunity / merge stage of
+leadScoring_featurePrep.py: the original full read and global sort, the
+typed read with a groupby for the latest rows, and the chunked read.
+
+    python benchmark_dedup.py --leads lead_data.csv --opps lead_opportunity_data.csv --chunksize 500000
+"""
+import argparse
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from lead_features import merge_leads, read_leads, read_lead_opps
+
+def original_merge(leads_path, opps_path):
+    """The stage as first written: every column, full-row dedup, sort by key and date."""
+    leads = pd.read_csv(leads_path)
+    lead_opps = pd.read_csv(opps_path, low_memory=False)
+    lead_opps.drop_duplicates(inplace=True)
+    leads.drop_duplicates(subset=['Lead_ID'], inplace=True)
+    lead_opps['Lead_Date'] = pd.to_datetime(lead_opps['Lead_Date'], errors='coerce')
+    leads['Lead_Date'] = pd.to_datetime(leads['Lead_Date'], errors='coerce')
+    lead_opps = lead_opps.sort_values(['Lead_ID', 'Opportunity_ID', 'Lead_Date'], ascending=[True, True, False])
+    lead_opps = lead_opps.drop_duplicates(subset=['Lead_ID', 'Opportunity_ID'], keep='first')
+    merged = lead_opps.merge(leads[['Lead_ID', 'Lead_Source', 'Lead_Date']], on='Lead_ID', how='left',
+                             suffixes=('_opp', '_lead'))
+    merged['Lead_Source'] = merged['Lead_Source_lead'].combine_first(merged['Lead_Source_opp'])
+    merged['Lead_Date'] = pd.to_datetime(merged['Lead_Date_lead'].combine_first(merged['Lead_Date_opp']), errors='coerce')
+    merged.drop_duplicates(subset=['Lead_ID', 'Opportunity_ID'], inplace=True)
+    merged['target'] = (merged.get('Sales_Stage_Status') == 'Won').astype(np.int8)
+    return merged
+
+def typed_merge(leads_path, opps_path, chunksize=None):
+    return merge_leads(read_leads(leads_path), read_lead_opps(opps_path, chunksize))
+
+def _run(variant, leads_path, opps_path, chunksize):
+    start = time.perf_counter()
+    if variant == "original":
+        merged = original_merge(leads_path, opps_path)
+    else:
+        merged = typed_merge(leads_path, opps_path, chunksize if variant == "chunked" else None)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    key = merged[['Lead_ID', 'Opportunity_ID', 'Lead_Source', 'Lead_Date', 'target']].astype({'Lead_Source': object})
+    return seconds, peak_mb, key.reset_index(drop=True)
+
+def benchmark(leads_path, opps_path, chunksize=500_000, variants=("original", "typed", "chunked")):
+    """Seconds, peak RSS and agreement with the original output per variant, each run in a fresh process."""
+    rows, reference = [], None
+    for variant in variants:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            seconds, peak_mb, key = pool.submit(_run, variant, leads_path, opps_path, chunksize).result()
+        reference = key if reference is None else reference
+        rows.append({"variant": variant, "seconds": seconds, "peak_rss_mb": peak_mb,
+                     "rows": len(key), "same_as_first": key.equals(reference)})
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dedup and latest-opportunity stage.")
+    parser.add_argument("--leads", default="lead_data.csv")
+    parser.add_argument("--opps", default="lead_opportunity_data.csv")
+    parser.add_argument("--chunksize", type=int, default=500_000, help="rows per chunk for the chunked read")
+    args = parser.parse_args()
+    print(benchmark(args.leads, args.opps, args.chunksize).to_string(index=False))
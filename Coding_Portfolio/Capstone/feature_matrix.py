@@ -0,0 +1,36 @@
+"""
+Lead scoring features as one scipy CSR matrix plus a column manifest.
+
+The .npz holds the CSR arrays under the names scipy.sparse.save_npz uses
+(so scipy.sparse.load_npz can read it too), the column names, the target
+and the Lead/Opportunity IDs, all row-aligned.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+def save_feature_matrix(path, X, columns, target, ids=None):
+    X = sparse.csr_matrix(X)
+    if X.shape[1] != len(columns):
+        raise ValueError(f"{X.shape[1]} columns in the matrix but {len(columns)} names")
+    arrays = dict(
+        format=np.array("csr"),
+        shape=np.array(X.shape),
+        data=X.data,
+        indices=X.indices,
+        indptr=X.indptr,
+        columns=np.array(columns, dtype=str),
+        target=np.asarray(target),
+    )
+    for name, values in (ids or {}).items():
+        arrays["id_" + name] = np.asarray(values)
+    np.savez_compressed(path, **arrays)
+
+def load_feature_matrix(path):
+    """(X as CSR, column names, target as a Series, DataFrame of IDs)"""
+    with np.load(path, allow_pickle=False) as f:
+        X = sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+        columns = list(f["columns"])
+        y = pd.Series(f["target"], name="target")
+        ids = pd.DataFrame({key[3:]: f[key] for key in f.files if key.startswith("id_")})
+    return X, columns, y, ids
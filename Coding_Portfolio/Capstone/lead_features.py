@@ -0,0 +1,167 @@
+"""
+Lead scoring feature prep as reusable pieces.
+
+merge_leads() cleans and merges the raw lead/opportunity exports, and
+LeadFeatureTransformer learns the product columns and one-hot categories on
+the training rows, so new leads are encoded exactly as at training time.
+A fitted transformer is saved and loaded with joblib.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import OneHotEncoder
+
+PRODUCT_GROUPS = {
+    "Category_A": ["Product_1", "Product_2", "Product_3"],
+    "Category_B": ["Product_4", "Product_5"],
+}
+ENCODED_COLS = ['lead_source_combined', 'lead_month', 'lead_quarter', 'lead_weekday']
+ID_COLS = ['Lead_ID', 'Opportunity_ID']
+PRODUCT_COLS = [p for products in PRODUCT_GROUPS.values() for p in products]
+# What merge_leads() and the features read from an opportunity export
+OPP_COLS = ID_COLS + ['Lead_Date', 'Lead_Source', 'Sales_Stage_Status'] + PRODUCT_COLS
+# Low-cardinality text columns, read as pandas categoricals
+CATEGORICAL_COLS = ['Lead_Source', 'Sales_Stage_Status'] + PRODUCT_COLS
+
+def _read_csv(path, columns, **kwargs):
+    """Only `columns` (those present in the file), text columns as categoricals."""
+    return pd.read_csv(path, usecols=lambda c: c in columns,
+                       dtype={c: 'category' for c in CATEGORICAL_COLS if c in columns}, **kwargs)
+
+def read_leads(path):
+    return _read_csv(path, ['Lead_ID', 'Lead_Source', 'Lead_Date'])
+
+def read_lead_opps(path, chunksize=None):
+    """
+    The columns of an opportunity export that merge_leads() and the features
+    use, with Lead_Date parsed. With chunksize, the file is streamed that many
+    rows at a time and only the latest row per (Lead_ID, Opportunity_ID) is
+    kept as it goes, so memory grows with the number of opportunities rather
+    than the number of rows in the export.
+    """
+    if chunksize is None:
+        return _parse_dates(_read_csv(path, OPP_COLS))
+    latest = None
+    for chunk in _read_csv(path, OPP_COLS, chunksize=chunksize):
+        chunk = latest_per_opportunity(_parse_dates(chunk))
+        # earlier rows first, so ties still go to the first row in the file
+        latest = chunk if latest is None else latest_per_opportunity(pd.concat([latest, chunk]))
+    return latest
+
+def _parse_dates(df):
+    return df.assign(Lead_Date=pd.to_datetime(df['Lead_Date'], errors='coerce'))
+
+def latest_per_opportunity(lead_opps):
+    """
+    The row with the latest Lead_Date for each (Lead_ID, Opportunity_ID),
+    the first in row order among ties or when no row has a date, in the
+    original row order. One hashed groupby instead of sorting every row.
+    """
+    latest = lead_opps.groupby(ID_COLS, sort=False, dropna=False)['Lead_Date'].transform('max')
+    is_latest = (lead_opps['Lead_Date'] == latest) | latest.isna()
+    return lead_opps[is_latest].drop_duplicates(subset=ID_COLS, keep='first')
+
+def merge_leads(leads, lead_opps):
+    """
+    Latest row per (Lead_ID, Opportunity_ID), with the lead's source and date
+    preferred over the opportunity's, and the target (Won = 1) when
+    Sales_Stage_Status is present. leads may be None, e.g. for new
+    opportunities that already carry their Lead_Source and Lead_Date.
+    """
+    # Keep latest opportunity per lead, ordered by Lead_ID and Opportunity_ID
+    lead_opps = latest_per_opportunity(_parse_dates(lead_opps)).sort_values(ID_COLS)
+
+    if leads is None:
+        merged = lead_opps
+    else:
+        leads = leads.drop_duplicates(subset=['Lead_ID'])
+        leads = _parse_dates(leads)
+        # one row per Lead_ID on the right, so no (Lead_ID, Opportunity_ID) is repeated
+        merged = lead_opps.merge(
+            leads[['Lead_ID', 'Lead_Source', 'Lead_Date']],
+            on='Lead_ID', how='left', suffixes=('_opp', '_lead')
+        )
+        merged['Lead_Source'] = merged['Lead_Source_lead'].combine_first(merged['Lead_Source_opp'])
+        merged['Lead_Date'] = pd.to_datetime(merged['Lead_Date_lead'].combine_first(merged['Lead_Date_opp']), errors='coerce')
+    if 'Sales_Stage_Status' in merged.columns:
+        merged = merged.assign(target=(merged['Sales_Stage_Status'] == 'Won').astype(np.int8))
+    return merged
+
+class LeadFeatureTransformer:
+    """
+    Date features, product-group flags and counts, and one-hot encodings of
+    the lead source and date parts, fitted on merge_leads() output. Sources
+    or dates not seen in fit() encode as all zeros; product columns missing
+    from new rows count as empty.
+    """
+    def __init__(self, product_groups=PRODUCT_GROUPS):
+        self.product_groups = product_groups
+
+    def _features(self, merged):
+        features = pd.DataFrame(index=merged.index)
+        features['lead_month'] = merged['Lead_Date'].dt.month.fillna(0).astype(np.int8)
+        features['lead_quarter'] = merged['Lead_Date'].dt.quarter.fillna(0).astype(np.int8)
+        features['lead_weekday'] = merged['Lead_Date'].dt.weekday.fillna(-1).astype(np.int8)
+        features['lead_is_weekend'] = features['lead_weekday'].isin([5, 6]).astype(np.int8)
+
+        counts = pd.DataFrame(index=merged.index)
+        for group, products in self.products_.items():
+            present = merged.reindex(columns=products)
+            counts[group] = present.notna().sum(axis=1)
+            features[group] = present.apply(pd.to_numeric, errors='coerce').notna().any(axis=1).astype(np.int8) if products else 0
+
+        features['num_product_categories'] = (counts > 0).sum(axis=1).astype(np.int8)
+        features['lead_source_combined'] = merged['Lead_Source']
+        return features
+
+    def _present_products(self, columns):
+        return {group: [p for p in products if p in columns] for group, products in self.product_groups.items()}
+
+    def fit(self, merged):
+        self.products_ = self._present_products(merged.columns)
+        return self.fit_features(self._features(merged))
+
+    def fit_features(self, features, columns=None):
+        """
+        Fit the encoders on features already laid out like _features(), e.g.
+        computed by lead_features_duckdb.py; columns are those of the export
+        they came from, which sets the product columns used for new rows.
+        """
+        if columns is not None:
+            self.products_ = self._present_products(columns)
+        self.encoders_ = {}
+        names = []
+        for col in ENCODED_COLS:
+            encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True, dtype=np.int8)
+            self.encoders_[col] = encoder.fit(features[[col]])
+            names += list(encoder.get_feature_names_out([col]))
+        names += [col for col in features.columns if col not in ENCODED_COLS]
+        # first of any repeated name, as in final_features.pkl
+        self.keep_ = np.flatnonzero(~pd.Index(names).duplicated())
+        self.feature_names_ = [names[i] for i in self.keep_]
+        return self
+
+    def _encode(self, merged, features=None):
+        if features is None:
+            features = self._features(merged)
+        encoded = [self.encoders_[col].transform(features[[col]]).tocsr() for col in ENCODED_COLS]
+        return encoded, features.drop(columns=ENCODED_COLS)
+
+    def transform(self, merged, features=None):
+        """Features as a CSR matrix, columns in feature_names_ order (features: precomputed, as in fit_features)."""
+        encoded, dense = self._encode(merged, features)
+        return sparse.hstack(encoded + [sparse.csr_matrix(dense.to_numpy())], format='csr')[:, self.keep_]
+
+    def to_frame(self, merged, features=None):
+        """Features, IDs and target (where present) as a DataFrame laid out like final_features.pkl."""
+        encoded, dense = self._encode(merged, features)
+        frames = [pd.DataFrame.sparse.from_spmatrix(matrix, columns=self.encoders_[col].get_feature_names_out([col]),
+                                                    index=merged.index)
+                  for col, matrix in zip(ENCODED_COLS, encoded)]
+        ids = merged[ID_COLS] if all(c in merged.columns for c in ID_COLS) else pd.DataFrame(index=merged.index)
+        frames += [dense, ids, merged[['target']] if 'target' in merged.columns else None]
+        final_features = pd.concat(frames, axis=1)
+        return final_features.loc[:, ~final_features.columns.duplicated()]
+
+    def fit_transform(self, merged):
+        return self.fit(merged).transform(merged)
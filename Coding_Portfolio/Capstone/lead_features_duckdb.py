@@ -0,0 +1,171 @@
+"""
+Out-of-core backend for the lead feature prep, on DuckDB.
+
+The CSVs are scanned by DuckDB and the dedup, latest-opportunity, merge,
+date-feature and product-group steps of lead_features.py run as one SQL
+query, spilling to temp_directory when memory_limit is reached. Only the
+result, one row of small integer features per opportunity, comes back to
+pandas for the one-hot encoding, so final_features.pkl and .npz come out
+with the same schema as with the pandas backend.
+
+    python lead_features_duckdb.py --rows 50000   # parity with lead_features.py on a sample
+"""
+import argparse
+import os
+import tempfile
+import duckdb
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+from lead_features import (LeadFeatureTransformer, PRODUCT_GROUPS, PRODUCT_COLS, ID_COLS,
+                           merge_leads, read_leads, read_lead_opps)
+
+# Strings pandas.read_csv reads as missing by default, so both backends agree on what counts as empty
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+def _quote(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+def _read_csv(path, text_cols):
+    """read_csv() table function for path: text_cols as VARCHAR, pandas' missing-value strings as NULL."""
+    types = ", ".join(f"{_quote(c)}: 'VARCHAR'" for c in text_cols)
+    nulls = ", ".join(_quote(v) for v in PANDAS_NA_VALUES)
+    return f"read_csv({_quote(path)}, header=true, nullstr=[{nulls}], types={{{types}}})"
+
+def _columns(con, path):
+    return [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM read_csv({_quote(path)}, header=true)").fetchall()]
+
+def _date_format(path, chunksize=100_000):
+    """
+    strftime format of Lead_Date in path, guessed from its first non-missing
+    value as pd.to_datetime does, or None if no value has a recognisable format.
+    """
+    for chunk in pd.read_csv(path, usecols=['Lead_Date'], dtype=str, chunksize=chunksize):
+        values = chunk['Lead_Date'].dropna()
+        if len(values):
+            return guess_datetime_format(values.iloc[0])
+    return None
+
+def _date_sql(fmt):
+    """Lead_Date as a TIMESTAMP, NULL where it does not parse with fmt."""
+    return f"try_strptime(Lead_Date, {_quote(fmt)})" if fmt else "TRY_CAST(Lead_Date AS TIMESTAMP)"
+
+def _check_dates(con, table, date_sql, path):
+    raw, parsed = con.execute(f"SELECT count(Lead_Date), count({date_sql}) FROM {table}").fetchone()
+    if raw and not parsed:
+        raise ValueError(f"None of the {raw} Lead_Date values in {path} parse as dates ({date_sql})")
+
+def duckdb_features(leads_path, opps_path, memory_limit=None, temp_directory=None, threads=None):
+    """
+    (rows, features, opportunity columns): rows holds Lead_ID, Opportunity_ID
+    and target per latest (Lead_ID, Opportunity_ID) in key order, features
+    the matching columns laid out like LeadFeatureTransformer._features().
+    Lead_Date is parsed with the format pandas infers for each file.
+    memory_limit is a DuckDB size such as '2GB'; past it, intermediate
+    results spill to temp_directory (default: a fresh temporary directory).
+    """
+    opp_date, lead_date = _date_sql(_date_format(opps_path)), _date_sql(_date_format(leads_path))
+    with tempfile.TemporaryDirectory() as scratch:
+        config = {"temp_directory": temp_directory or scratch}
+        if memory_limit:
+            config["memory_limit"] = memory_limit
+        if threads:
+            config["threads"] = threads
+        con = duckdb.connect(config=config)
+        try:
+            opp_cols = _columns(con, opps_path)
+            products = {group: [p for p in ps if p in opp_cols] for group, ps in PRODUCT_GROUPS.items()}
+            text_cols = [c for c in ['Lead_Date', 'Lead_Source', 'Sales_Stage_Status'] + PRODUCT_COLS if c in opp_cols]
+            # tables keep file order in rowid, which breaks ties the way the pandas backend does
+            con.execute(f"CREATE TEMP TABLE opps AS SELECT {', '.join(ID_COLS + text_cols)} "
+                        f"FROM {_read_csv(opps_path, text_cols)}")
+            con.execute(f"CREATE TEMP TABLE leads AS SELECT Lead_ID, Lead_Source, Lead_Date "
+                        f"FROM {_read_csv(leads_path, ['Lead_Source', 'Lead_Date'])}")
+            _check_dates(con, "opps", opp_date, opps_path)
+            _check_dates(con, "leads", lead_date, leads_path)
+
+            group_sql = []
+            for group, cols in products.items():
+                count = " + ".join(f"({c} IS NOT NULL)::INTEGER" for c in cols) or "0"
+                numeric = " OR ".join(f"TRY_CAST({c} AS DOUBLE) IS NOT NULL" for c in cols) or "false"
+                group_sql += [f"{count} AS {group}_count", f"({numeric})::TINYINT AS {group}"]
+            rows = con.execute(f"""
+                WITH latest AS (
+                    SELECT *, {opp_date} AS opp_date FROM opps
+                    QUALIFY row_number() OVER (PARTITION BY Lead_ID, Opportunity_ID
+                                               ORDER BY {opp_date} DESC NULLS LAST, rowid) = 1
+                ), first_leads AS (
+                    SELECT Lead_ID, Lead_Source, {lead_date} AS lead_ts FROM leads
+                    QUALIFY row_number() OVER (PARTITION BY Lead_ID ORDER BY rowid) = 1
+                ), merged AS (
+                    SELECT o.*, coalesce(l.Lead_Source, o.Lead_Source) AS source,
+                           coalesce(l.lead_ts, o.opp_date) AS feature_date
+                    FROM latest o LEFT JOIN first_leads l ON o.Lead_ID IS NOT DISTINCT FROM l.Lead_ID
+                ), grouped AS (
+                    SELECT *, {', '.join(group_sql)} FROM merged
+                )
+                SELECT Lead_ID, Opportunity_ID,
+                       coalesce(Sales_Stage_Status = 'Won', false)::TINYINT AS target,
+                       coalesce(month(feature_date), 0)::TINYINT AS lead_month,
+                       coalesce(quarter(feature_date), 0)::TINYINT AS lead_quarter,
+                       coalesce(isodow(feature_date) - 1, -1)::TINYINT AS lead_weekday,
+                       coalesce(isodow(feature_date) >= 6, false)::TINYINT AS lead_is_weekend,
+                       {', '.join(products)},
+                       ({' + '.join(f'({g}_count > 0)::INTEGER' for g in products)})::TINYINT AS num_product_categories,
+                       source AS lead_source_combined
+                FROM grouped
+                ORDER BY Lead_ID NULLS LAST, Opportunity_ID NULLS LAST
+            """).df()
+        finally:
+            con.close()
+
+    for col in ID_COLS:
+        # pandas reads integer IDs with gaps as float
+        if isinstance(rows[col].dtype, pd.Int64Dtype):
+            rows[col] = rows[col].astype('float64')
+    features = rows[['lead_month', 'lead_quarter', 'lead_weekday', 'lead_is_weekend']].astype(np.int8)
+    for group, cols in products.items():
+        features[group] = rows[group].astype(np.int8) if cols else 0
+    features['num_product_categories'] = rows['num_product_categories'].astype(np.int8)
+    source = rows['lead_source_combined']
+    features['lead_source_combined'] = source.where(source.notna(), np.nan)
+    return rows[ID_COLS + ['target']].astype({'target': np.int8}), features, opp_cols
+
+def build_features(leads_path, opps_path, **options):
+    """(fitted LeadFeatureTransformer, rows, features) from duckdb_features(); options go to it."""
+    rows, features, opp_cols = duckdb_features(leads_path, opps_path, **options)
+    return LeadFeatureTransformer().fit_features(features, opp_cols), rows, features
+
+def parity_check(leads_path="lead_data.csv", opps_path="lead_opportunity_data.csv", n_rows=50_000, **options):
+    """
+    Build final_features from the first n_rows of each CSV with both
+    backends and compare them (values, dtypes, column order). Returns True
+    if they are identical.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        sample = {}
+        for name, path in (("leads", leads_path), ("opps", opps_path)):
+            sample[name] = os.path.join(scratch, os.path.basename(path))
+            pd.read_csv(path, nrows=n_rows, dtype=str, keep_default_na=False).to_csv(sample[name], index=False)
+
+        merged = merge_leads(read_leads(sample["leads"]), read_lead_opps(sample["opps"]))
+        expected = LeadFeatureTransformer().fit(merged).to_frame(merged)
+        transformer, rows, features = build_features(sample["leads"], sample["opps"], **options)
+        result = transformer.to_frame(rows, features)
+    try:
+        pd.testing.assert_frame_equal(result, expected)
+    except AssertionError as err:
+        print(f"DuckDB and pandas backends differ on the first {n_rows} rows:\n{err}")
+        return False
+    print(f"DuckDB and pandas backends agree on the first {n_rows} rows ({len(result)} opportunities).")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the DuckDB feature backend against the pandas one.")
+    parser.add_argument("--leads", default="lead_data.csv")
+    parser.add_argument("--opps", default="lead_opportunity_data.csv")
+    parser.add_argument("--rows", type=int, default=50_000, help="rows of each CSV in the sample")
+    parser.add_argument("--memory-limit", default=None, help="DuckDB memory limit, e.g. 500MB")
+    args = parser.parse_args()
+    raise SystemExit(0 if parity_check(args.leads, args.opps, args.rows, memory_limit=args.memory_limit) else 1)
@@ -0,0 +1,94 @@
+"""
+Score new leads with the saved feature transformer (leadScoring_featurePrep.py)
+and RF/LightGBM ensemble (test_models.py --save-models).
+
+    python score_leads.py new_opportunities.csv --output lead_scores.csv
+    python score_leads.py lead_opportunity_data.csv --benchmark
+"""
+import argparse
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+import joblib
+from lead_features import merge_leads, ID_COLS
+from test_models import ensemble
+
+def _load(obj):
+    return joblib.load(obj) if isinstance(obj, (str, os.PathLike)) else obj
+
+def _check_columns(transformer, models):
+    n_features = len(transformer.feature_names_)
+    for name, model in models.items():
+        if model.n_features_in_ != n_features:
+            raise ValueError(f"Model {name!r} was trained on {model.n_features_in_} features, "
+                             f"the transformer makes {n_features}")
+
+def score_leads(lead_opps, leads=None, transformer="feature_transformer.joblib", models="lead_models.joblib"):
+    """
+    Ensemble P(won) for new opportunity rows, as a DataFrame of Lead_ID,
+    Opportunity_ID and score with one row per latest (Lead_ID, Opportunity_ID).
+    The rows go through the same merge_leads() and fitted transformer as the
+    training data; pass leads to take Lead_Source and Lead_Date from the lead
+    table, or leave it out when the rows carry their own. transformer and
+    models are paths or already loaded objects; load them once with
+    joblib.load when scoring repeatedly.
+    """
+    transformer, bundle = _load(transformer), _load(models)
+    _check_columns(transformer, bundle["models"])
+    merged = merge_leads(leads, lead_opps)
+    X = transformer.transform(merged).astype(np.float32)
+
+    with warnings.catch_warnings():
+        # models fitted on final_features.pkl carry its column names; the CSR columns are in the same order
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        preds = {name: model.predict_proba(X)[:, 1] for name, model in bundle["models"].items()}
+    scores = merged[[c for c in ID_COLS if c in merged.columns]].reset_index(drop=True)
+    scores["score"] = ensemble(preds, bundle["weights"])
+    return scores
+
+def benchmark(lead_opps, leads=None, transformer="feature_transformer.joblib", models="lead_models.joblib",
+              sizes=(1, 100_000), repeats=None, seed=0):
+    """
+    Time score_leads() on batches of each size drawn from lead_opps (with
+    replacement, renumbered so no rows collapse in the dedup). repeats
+    defaults to enough runs for about 10^6 rows per size, between 3 and 200.
+    Returns a row per size with the median and best time in milliseconds.
+    """
+    transformer, bundle = _load(transformer), _load(models)
+    results = []
+    for size in sizes:
+        batch = lead_opps.sample(size, replace=True, random_state=seed).reset_index(drop=True)
+        batch['Opportunity_ID'] = np.arange(size)
+        times = []
+        for _ in range(repeats or max(3, min(200, 1_000_000 // size))):
+            start = time.perf_counter()
+            score_leads(batch, leads, transformer, bundle)
+            times.append(time.perf_counter() - start)
+        results.append({"rows": size, "median_ms": 1000 * np.median(times), "best_ms": 1000 * min(times),
+                        "rows_per_s": size / np.median(times)})
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score new leads with the saved transformer and ensemble.")
+    parser.add_argument("opportunities", help="CSV of new opportunity rows, same columns as lead_opportunity_data.csv")
+    parser.add_argument("--leads", default=None, help="lead_data.csv-style CSV to take Lead_Source/Lead_Date from")
+    parser.add_argument("--transformer", default="feature_transformer.joblib")
+    parser.add_argument("--models", default="lead_models.joblib")
+    parser.add_argument("--output", default="lead_scores.csv")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="time 1-row and 100k-row batches drawn from the CSV instead of scoring it")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100_000], help="batch sizes for --benchmark")
+    args = parser.parse_args()
+
+    lead_opps = pd.read_csv(args.opportunities, low_memory=False)
+    leads = pd.read_csv(args.leads) if args.leads else None
+    transformer, models = joblib.load(args.transformer), joblib.load(args.models)
+
+    if args.benchmark:
+        print(benchmark(lead_opps, leads, transformer, models, args.sizes).to_string(index=False))
+    else:
+        scores = score_leads(lead_opps, leads, transformer, models)
+        scores.to_csv(args.output, index=False)
+        print(f"Scored {len(scores)} opportunities -> {args.output}")
@@ -1,46 +1,147 @@
+import argparse
+import os
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed, dump, hash as joblib_hash, parallel_config
 from sklearn.model_selection import StratifiedKFold
 from sklearn.ensemble import RandomForestClassifier
 from lightgbm import LGBMClassifier
 from sklearn.metrics import roc_auc_score
+from feature_matrix import load_feature_matrix
 
-# Load data
-df = pd.read_pickle("final_features.pkl")
-X = df.drop(columns=['target', 'Lead_ID', 'Opportunity_ID'], errors='ignore')
-y = df['target']
+# Model name -> (class, parameters); n_jobs is set per fit from the thread budget
+MODELS = {
+    "rf": (RandomForestClassifier, dict(n_estimators=100, max_depth=5, random_state=99)),
+    "lgbm": (LGBMClassifier, dict(n_estimators=100, max_depth=5, random_state=99)),
+}
 
-# Setup CV
-kf = StratifiedKFold(n_splits=5, shuffle=True, random_state=99)
+N_SPLITS = 5
+CV_SEED = 99
 
-rf_aucs = []
-lgbm_aucs = []
-ensemble_aucs = []
+def load_features(path="final_features.pkl"):
+    """
+    Features and target from leadScoring_featurePrep.py: a DataFrame from the
+    .pkl, or a scipy CSR matrix from the .npz, which the forests and boosters
+    take as is and which is sliced per fold without densifying.
+    """
+    if path.endswith(".npz"):
+        X, _, y, _ = load_feature_matrix(path)
+        # stored as int8; LightGBM takes float32/float64 sparse values only
+        return X.astype(np.float32), y
+    df = pd.read_pickle(path)
+    X = df.drop(columns=['target', 'Lead_ID', 'Opportunity_ID'], errors='ignore')
+    y = df['target']
+    return X, y
 
-for train_idx, val_idx in kf.split(X, y):
-    X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
-    y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
+def cv_folds(X, y, n_splits=N_SPLITS, seed=CV_SEED):
+    kf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    return list(kf.split(X, y))
 
-    # Random Forest
-    rf = RandomForestClassifier(n_estimators=100, max_depth=5, random_state=99)
-    rf.fit(X_train, y_train)
-    rf_preds = rf.predict_proba(X_val)[:,1]
-    rf_auc = roc_auc_score(y_val, rf_preds)
-    rf_aucs.append(rf_auc)
+def _rows(X, idx):
+    return X.iloc[idx] if isinstance(X, pd.DataFrame) else X[idx]
 
-    # LightGBM
-    lgbm = LGBMClassifier(n_estimators=100, max_depth=5, random_state=99)
-    lgbm.fit(X_train, y_train)
-    lgbm_preds = lgbm.predict_proba(X_val)[:,1]
-    lgbm_auc = roc_auc_score(y_val, lgbm_preds)
-    lgbm_aucs.append(lgbm_auc)
+def fit_fold(name, X, y, train_idx, val_idx, n_threads=1):
+    """Fit model `name` on one fold's training rows; predicted P(won) for its validation rows."""
+    cls, params = MODELS[name]
+    model = cls(**params, n_jobs=n_threads)
+    model.fit(_rows(X, train_idx), y.iloc[train_idx])
+    return model.predict_proba(_rows(X, val_idx))[:, 1]
 
+def _cache_file(cache_dir, name, fold, data_key):
+    cls, params = MODELS[name]
+    key = joblib_hash((data_key, cls.__name__, params, N_SPLITS, CV_SEED, fold))
+    return os.path.join(cache_dir, f"oof_{name}_fold{fold}_{key}.npy")
+
+def run_cv(X, y, models=tuple(MODELS), workers=None, cache_dir="oof_cache"):
+    """
+    Out-of-fold predictions for each model, as {name: array aligned with y}.
+
+    Every (model, fold) fit runs as its own task in a process pool of
+    `workers` processes (default: one per core, at most one per task), and
+    each fit gets an equal share of the cores as its thread budget, so the
+    forests and boosters together never ask for more threads than there are
+    cores. With cache_dir, each fold's predictions are saved under a key of
+    the data, model parameters and CV split, and reused on the next run.
+    """
+    folds = cv_folds(X, y)
+    data_key = joblib_hash((X, y)) if cache_dir else None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    oof = {name: np.full(len(y), np.nan) for name in models}
+    todo = []
+    for name in models:
+        for fold, (_, val_idx) in enumerate(folds):
+            path = _cache_file(cache_dir, name, fold, data_key) if cache_dir else None
+            if path and os.path.exists(path):
+                oof[name][val_idx] = np.load(path)
+            else:
+                todo.append((name, fold, path))
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(todo) or 1))
+    n_threads = max(1, cores // workers)
+    # inner_max_num_threads also caps OpenMP/BLAS pools inside each worker
+    with parallel_config(backend="loky", inner_max_num_threads=n_threads):
+        results = Parallel(n_jobs=workers)(
+            delayed(fit_fold)(name, X, y, folds[fold][0], folds[fold][1], n_threads) for name, fold, _ in todo
+        )
+    for (name, fold, path), preds in zip(todo, results):
+        oof[name][folds[fold][1]] = preds
+        if path:
+            np.save(path, preds)
+    return oof, folds
+
+def fit_final(X, y, models=tuple(MODELS)):
+    """Each model refitted on every row, for scoring new leads (score_leads.py)."""
+    fitted = {}
+    for name in models:
+        cls, params = MODELS[name]
+        fitted[name] = cls(**params, n_jobs=os.cpu_count() or 1).fit(X, y)
+    return fitted
+
+def fold_aucs(y, preds, folds):
+    return [roc_auc_score(y.iloc[val_idx], preds[val_idx]) for _, val_idx in folds]
+
+def ensemble(oof, weights):
+    """Weighted average of out-of-fold predictions, e.g. weights={'rf': 0.3, 'lgbm': 0.7}."""
+    total = sum(weights.values())
+    return sum(oof[name] * w for name, w in weights.items()) / total
+
+def parse_weights(text):
+    """'rf=0.3,lgbm=0.7' -> {'rf': 0.3, 'lgbm': 0.7}"""
+    return {name: float(w) for name, w in (part.split("=") for part in text.split(","))}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate the lead scoring models.")
+    parser.add_argument("--features", default="final_features.pkl", help="final_features.pkl or final_features.npz")
+    parser.add_argument("--workers", type=int, default=None, help="parallel fits (default: one per core)")
+    parser.add_argument("--cache-dir", default="oof_cache", help="where out-of-fold predictions are cached")
+    parser.add_argument("--no-cache", action="store_true", help="refit everything and do not save predictions")
+    parser.add_argument("--weights", action="append", default=[], metavar="rf=W,lgbm=W",
+                        help="extra ensemble weighting to score from the cached predictions (repeatable)")
+    parser.add_argument("--save-models", metavar="PATH", default=None,
+                        help="refit the models on all rows and save them with the ensemble weights "
+                             "(the first --weights, else equal) for score_leads.py, e.g. lead_models.joblib")
+    args = parser.parse_args()
+
+    # Load data
+    X, y = load_features(args.features)
+    oof, folds = run_cv(X, y, workers=args.workers, cache_dir=None if args.no_cache else args.cache_dir)
+
+    rf_aucs = fold_aucs(y, oof["rf"], folds)
+    lgbm_aucs = fold_aucs(y, oof["lgbm"], folds)
     # Simple average ensemble
-    ensemble_preds = (rf_preds + lgbm_preds) / 2
-    ensemble_auc = roc_auc_score(y_val, ensemble_preds)
-    ensemble_aucs.append(ensemble_auc)
+    ensemble_aucs = fold_aucs(y, ensemble(oof, {"rf": 1, "lgbm": 1}), folds)
+
+    print(f"Random Forest CV ROC AUC: {np.mean(rf_aucs):.4f}")
+    print(f"LightGBM CV ROC AUC: {np.mean(lgbm_aucs):.4f}")
+    print(f"Ensemble CV ROC AUC: {np.mean(ensemble_aucs):.4f}")
 
-print(f"Random Forest CV ROC AUC: {np.mean(rf_aucs):.4f}")
-print(f"LightGBM CV ROC AUC: {np.mean(lgbm_aucs):.4f}")
-print(f"Ensemble CV ROC AUC: {np.mean(ensemble_aucs):.4f}")
+    for text in args.weights:
+        aucs = fold_aucs(y, ensemble(oof, parse_weights(text)), folds)
+        print(f"Ensemble {text} CV ROC AUC: {np.mean(aucs):.4f}")
 
+    if args.save_models:
+        weights = parse_weights(args.weights[0]) if args.weights else {"rf": 1, "lgbm": 1}
+        dump({"models": fit_final(X, y, tuple(weights)), "weights": weights}, args.save_models)
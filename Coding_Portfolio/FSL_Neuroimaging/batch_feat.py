@@ -1,30 +1,108 @@
+import argparse
 import subprocess
 import glob
 import os
+from datetime import datetime
 from pathlib import Path
 
 feat_script = "./scripts/run_feat.sh"
 fsf_pattern = "./data/**/*.fsf"
+manifest_dir = "./manifests"
 
-fsf_files = glob.glob(fsf_pattern, recursive=True)
+# SLURM's default MaxArraySize is 1001, so arrays of up to 1000 tasks are safe
+DEFAULT_CHUNK_SIZE = 1000
 
-for fsf in fsf_files[:300]:
-    feat_dir = fsf.replace(".fsf", ".feat")
+def find_pending(pattern=fsf_pattern):
+    """.fsf files matching pattern that do not have a .feat directory yet."""
+    pending = []
+    for fsf in sorted(glob.glob(pattern, recursive=True)):
+        feat_dir = fsf.replace(".fsf", ".feat")
 
-    # Skip if corresponding .feat directory already exists
-    if Path(feat_dir).exists():
-        print(f"Skipping {fsf} (feat directory already exists)")
-        continue
+        # Skip if corresponding .feat directory already exists
+        if Path(feat_dir).exists():
+            print(f"Skipping {fsf} (feat directory already exists)")
+            continue
+        pending.append(fsf)
+    return pending
 
-    print(f"Running feat for {fsf}")
-    result = subprocess.run(
-        ["sbatch", feat_script, fsf],
-        capture_output=True,
-        text=True
-    )
+def submit_individually(fsf_files, script=feat_script):
+    """One sbatch call per .fsf file."""
+    for fsf in fsf_files:
+        print(f"Running feat for {fsf}")
+        result = subprocess.run(
+            ["sbatch", script, fsf],
+            capture_output=True,
+            text=True
+        )
 
-    if result.returncode == 0:
-        print(f"Submitted job for {fsf}: {result.stdout.strip()}")
-    else:
-        print(f"Failed to submit job for {fsf}: {result.stderr.strip()}")
+        if result.returncode == 0:
+            print(f"Submitted job for {fsf}: {result.stdout.strip()}")
+        else:
+            print(f"Failed to submit job for {fsf}: {result.stderr.strip()}")
+
+def write_array_script(manifest, script=feat_script):
+    """
+    Job script for one array: the #SBATCH lines of script, then a call to
+    script with the manifest line for this array task.
+    """
+    header = [line for line in Path(script).read_text().splitlines() if line.startswith("#SBATCH")]
+    array_script = Path(manifest).with_suffix(".sh")
+    array_script.write_text("\n".join([
+        "#!/bin/bash",
+        *header,
+        f'fsf=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" "{manifest}")',
+        f'bash "{os.path.abspath(script)}" "$fsf"',
+        "",
+    ]))
+    return array_script
+
+def submit_arrays(fsf_files, script=feat_script, chunk_size=DEFAULT_CHUNK_SIZE, max_concurrent=None, out_dir=manifest_dir):
+    """
+    Submit fsf_files as SLURM job arrays of up to chunk_size tasks each, so
+    the scheduler sees one sbatch call per chunk. Each array reads its .fsf
+    paths from a manifest file in out_dir; max_concurrent caps how many tasks
+    of an array run at once (sbatch --array=...%N). Returns the job IDs.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    job_ids = []
+    for start in range(0, len(fsf_files), chunk_size):
+        chunk = fsf_files[start:start + chunk_size]
+        manifest = Path(out_dir) / f"feat_{stamp}_{start // chunk_size:03d}.txt"
+        manifest.write_text("\n".join(os.path.abspath(f) for f in chunk) + "\n")
+        array_script = write_array_script(manifest.resolve(), script)
+
+        array = f"0-{len(chunk) - 1}" + (f"%{max_concurrent}" if max_concurrent else "")
+        result = subprocess.run(
+            ["sbatch", "--parsable", f"--array={array}", str(array_script)],
+            capture_output=True,
+            text=True
+        )
 
+        if result.returncode == 0:
+            job_id = result.stdout.strip()
+            job_ids.append(job_id)
+            print(f"Submitted array job {job_id} for {len(chunk)} fsf files: {manifest}")
+        else:
+            print(f"Failed to submit array for {manifest}: {result.stderr.strip()}")
+    return job_ids
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submit FSL FEAT jobs for .fsf files without a .feat directory.")
+    parser.add_argument("--pattern", default=fsf_pattern, help=f"glob for .fsf files (default {fsf_pattern})")
+    parser.add_argument("--script", default=feat_script, help=f"FEAT job script (default {feat_script})")
+    parser.add_argument("--limit", type=int, default=None, help="submit at most this many .fsf files")
+    parser.add_argument("--array", action="store_true", help="submit SLURM job arrays from manifest files")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"tasks per job array (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="tasks of each array allowed to run at once (%%N)")
+    parser.add_argument("--manifest-dir", default=manifest_dir, help=f"where manifests are written (default {manifest_dir})")
+    args = parser.parse_args()
+
+    fsf_files = find_pending(args.pattern)[:args.limit]
+
+    if args.array:
+        submit_arrays(fsf_files, args.script, args.chunk_size, args.max_concurrent, args.manifest_dir)
+    else:
+        submit_individually(fsf_files, args.script)
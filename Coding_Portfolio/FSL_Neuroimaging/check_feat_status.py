@@ -2,9 +2,34 @@
 """
 Check the status of FSL FEAT analysis folders by inspecting their log files.
 """
+import argparse
+import json
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
+STATUSES = ("processing", "errored", "finished", "missing_log")
+
+# Statuses that will not change until FEAT is re-run, so they can be cached
+FINAL_STATUSES = ("errored", "finished")
+
+# The refresh tag sits at the top of report_log.html and FEAT appends errors
+# at the bottom, so only these parts of large logs are read.
+HEAD_BYTES = 16 * 1024
+TAIL_BYTES = 64 * 1024
+
+def classify_log(content: str) -> str:
+    """Status for the text of a report_log.html."""
+    content = content.lower()
+    if "<meta http-equiv=refresh" in content:
+        return "processing"
+    if "error" in content:
+        return "errored"
+    return "finished"
+
 def check_status(feat_dir: Path) -> str:
     """
     Return one of: 'processing', 'errored', 'finished', or 'missing_log'
@@ -13,31 +38,212 @@ def check_status(feat_dir: Path) -> str:
     log_file = feat_dir / "report_log.html"
     if not log_file.exists():
         return "missing_log"
-    content = log_file.read_text(errors="ignore").lower()
-    if "<meta http-equiv=refresh" in content:
-        return "processing"
-    if "error" in content:
-        return "errored"
-    return "finished"
+    return classify_log(log_file.read_text(errors="ignore"))
+
+def read_head_tail(log_file: Path, size: int, head: int = HEAD_BYTES, tail: int = TAIL_BYTES) -> str:
+    """Text of the first head and last tail bytes of a file (all of it if small)."""
+    with open(log_file, "rb") as f:
+        if size <= head + tail:
+            data = f.read()
+        else:
+            data = f.read(head)
+            f.seek(size - tail)
+            data += b"\n" + f.read(tail)
+    return data.decode(errors="ignore")
+
+def find_feat_dirs(root_path: Path, dir_mtimes: dict = None) -> list:
+    """
+    All *.feat directories under root_path, without descending into them.
+    If dir_mtimes is given, the mtime of every other directory walked is
+    recorded in it.
+    """
+    feat_dirs = []
+    for dirpath, dirnames, _ in os.walk(root_path):
+        if dir_mtimes is not None:
+            try:
+                dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        for name in [d for d in dirnames if d.endswith(".feat")]:
+            feat_dirs.append(Path(dirpath) / name)
+            dirnames.remove(name)
+    return sorted(feat_dirs)
+
+class StatusCache:
+    """
+    Finished/errored statuses keyed by log path, stored as JSON. An entry is
+    only reused while the log's mtime and size are unchanged.
+    """
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.entries = {}
+        if cache_file and Path(cache_file).exists():
+            with open(cache_file) as f:
+                self.entries = json.load(f)
+
+    def get(self, log_file: Path, stat: os.stat_result):
+        entry = self.entries.get(str(log_file))
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["status"]
+        return None
+
+    def set(self, log_file: Path, stat: os.stat_result, status: str):
+        if status in FINAL_STATUSES:
+            self.entries[str(log_file)] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "status": status}
+        else:
+            self.entries.pop(str(log_file), None)
+
+    def save(self):
+        if self.cache_file:
+            with open(self.cache_file, "w") as f:
+                json.dump(self.entries, f)
+
+def scan_status(feat_dir: Path, cache: StatusCache) -> str:
+    """check_status for a scan: head/tail reads and cached final statuses."""
+    log_file = feat_dir / "report_log.html"
+    try:
+        stat = log_file.stat()
+    except FileNotFoundError:
+        return "missing_log"
+    status = cache.get(log_file, stat)
+    if status is None:
+        status = classify_log(read_head_tail(log_file, stat.st_size))
+        cache.set(log_file, stat, status)
+    return status
+
+def scan_feat_dirs(root_path: Path, workers: int = 16, cache_file=None) -> dict:
+    """Map each status to the .feat directories under root_path that have it."""
+    cache = StatusCache(cache_file)
+    feat_dirs = find_feat_dirs(root_path)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda d: scan_status(d, cache), feat_dirs))
+    cache.save()
+
+    statuses = {status: [] for status in STATUSES}
+    for d, status in zip(feat_dirs, results):
+        statuses[status].append(str(d))
+    return statuses
+
+def _log_stat(feat_dir: Path):
+    try:
+        stat = (feat_dir / "report_log.html").stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class FeatWatcher:
+    """
+    Tracks .feat statuses under root_path across repeated polls. Only the
+    first poll walks the whole tree; after that, directories are re-listed
+    only when their mtime changes (to pick up new .feat folders), and logs
+    are only read again when their mtime or size changes.
+    """
+    def __init__(self, root_path: Path, workers: int = 16, cache_file=None):
+        self.root_path = root_path
+        self.workers = workers
+        self.cache = StatusCache(cache_file)
+        self.dir_mtimes = {}
+        self.log_stats = {}
+        self.statuses = {}
+
+    def _new_feat_dirs(self) -> list:
+        if not self.dir_mtimes:
+            return find_feat_dirs(self.root_path, self.dir_mtimes)
+
+        new = []
+        for dirpath, mtime in list(self.dir_mtimes.items()):
+            try:
+                current = os.stat(dirpath).st_mtime_ns
+            except FileNotFoundError:
+                del self.dir_mtimes[dirpath]
+                continue
+            if current == mtime:
+                continue
+            self.dir_mtimes[dirpath] = current
+            for entry in os.scandir(dirpath):
+                if not entry.is_dir() or entry.path in self.dir_mtimes:
+                    continue
+                path = Path(entry.path)
+                if entry.name.endswith(".feat"):
+                    if path not in self.statuses:
+                        new.append(path)
+                else:
+                    new.extend(find_feat_dirs(path, self.dir_mtimes))
+        return new
+
+    def _classify(self, feat_dir: Path):
+        stat = _log_stat(feat_dir)
+        if stat is None:
+            return stat, ("missing_log" if feat_dir.is_dir() else "removed")
+        return stat, scan_status(feat_dir, self.cache)
+
+    def poll(self) -> list:
+        """
+        Rescan what may have changed and return the status transitions as
+        (path, old_status, new_status); old_status is None for new directories.
+        """
+        candidates = self._new_feat_dirs()
+        for feat_dir in self.statuses:
+            stat = _log_stat(feat_dir)
+            if stat != self.log_stats[feat_dir] or (stat is None and not feat_dir.is_dir()):
+                candidates.append(feat_dir)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self._classify, candidates))
+        self.cache.save()
+
+        transitions = []
+        for feat_dir, (stat, status) in zip(candidates, results):
+            old = self.statuses.get(feat_dir)
+            if status == "removed":
+                self.statuses.pop(feat_dir, None)
+                self.log_stats.pop(feat_dir, None)
+            else:
+                self.statuses[feat_dir] = status
+                self.log_stats[feat_dir] = stat
+            if status != old:
+                transitions.append((str(feat_dir), old, status))
+        return transitions
+
+def watch(root_path: Path, interval: float = 30, as_json: bool = False, workers: int = 16, cache_file=None):
+    """Poll root_path forever, printing each status transition as it happens."""
+    watcher = FeatWatcher(root_path, workers=workers, cache_file=cache_file)
+    while True:
+        for path, old, new in watcher.poll():
+            stamp = datetime.now().isoformat(timespec="seconds")
+            if as_json:
+                print(json.dumps({"time": stamp, "path": path, "from": old, "to": new}))
+            else:
+                print(f"[{stamp}] {path}: {old or 'new'} -> {new}")
+        sys.stdout.flush()
+        time.sleep(interval)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(f"Usage: {sys.argv[0]} <root_path>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("root_path", type=Path)
+    parser.add_argument("--workers", type=int, default=16, help="threads reading logs (default 16)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="JSON file remembering finished/errored directories between scans")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and print status transitions as they happen")
+    parser.add_argument("--interval", type=float, default=30, help="seconds between --watch polls (default 30)")
+    parser.add_argument("--json", action="store_true", help="print --watch transitions as JSON lines")
+    args = parser.parse_args()
 
-    root_path = Path(sys.argv[1])
-    if not root_path.is_dir():
-        print(f"Error: {root_path} is not a valid directory")
+    if not args.root_path.is_dir():
+        print(f"Error: {args.root_path} is not a valid directory")
         sys.exit(1)
 
-    feat_dirs = list(root_path.rglob("*.feat"))
+    if args.watch:
+        try:
+            watch(args.root_path, args.interval, args.json, args.workers, args.cache)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
 
-    statuses = {"processing": [], "errored": [], "finished": [], "missing_log": []}
-    for d in feat_dirs:
-        statuses[check_status(d)].append(str(d))
+    statuses = scan_feat_dirs(args.root_path, workers=args.workers, cache_file=args.cache)
 
     for status, dirs in statuses.items():
         print(f"\n=== {status.upper()} ({len(dirs)}) ===")
         for path in dirs:
             print(path)
-
@@ -0,0 +1,143 @@
+"""
+Checks for the SLURM submission in batch_feat.py and import.py, run without
+a cluster or Flywheel: a stub sbatch first on PATH logs each call and prints
+a job ID, and FakeFlywheel stands in for flywheel.Client.
+
+    python check_submission.py
+"""
+import importlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+import pandas as pd
+from batch_feat import submit_arrays
+
+# import is a keyword, so import.py can only be loaded by name
+flywheel_import = importlib.import_module("import")
+
+STUB_SBATCH = """#!/bin/sh
+echo "$@" >> "$SBATCH_LOG"
+wc -l < "$SBATCH_LOG" | tr -d ' '
+"""
+
+@contextmanager
+def stub_sbatch(tmp):
+    """
+    Put a stub sbatch first on PATH for the duration of the block. Yields a
+    function returning the argument lines of every sbatch call so far; the
+    job IDs it prints are 1, 2, ... in call order.
+    """
+    stub = Path(tmp) / "bin" / "sbatch"
+    stub.parent.mkdir(parents=True)
+    stub.write_text(STUB_SBATCH)
+    stub.chmod(0o755)
+    log = Path(tmp) / "sbatch.log"
+    env = {"PATH": f"{stub.parent}{os.pathsep}{os.environ.get('PATH', '')}", "SBATCH_LOG": str(log)}
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        yield lambda: log.read_text().splitlines() if log.exists() else []
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+class FakeFlywheel:
+    """
+    Stand-in for flywheel.Client: resolve() returns a project whose children
+    carry the given labels, and records each call.
+    """
+    def __init__(self, projects):
+        self.projects = projects
+        self.resolved = []
+
+    def resolve(self, path):
+        self.resolved.append(path)
+        return SimpleNamespace(children=[SimpleNamespace(label=label) for label in self.projects[path]])
+
+def _report(checks):
+    for name, ok in checks.items():
+        print(f"{name}: {'ok' if ok else 'FAILED'}")
+    return all(checks.values())
+
+def check_arrays(n_files=7, chunk_size=3, max_concurrent=2):
+    """
+    submit_arrays() on n_files dummy .fsf files: one sbatch call per chunk,
+    --array=0-(n-1)%N arguments, manifest contents and #SBATCH lines.
+    """
+    with TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        script = tmp / "run_feat.sh"
+        script.write_text("#!/bin/bash\n#SBATCH --time=04:00:00\n#SBATCH --mem=8G\nfeat \"$1\"\n")
+        fsf_files = [str(tmp / "data" / f"sub-{i:02d}.fsf") for i in range(n_files)]
+        with stub_sbatch(tmp) as sbatch_calls:
+            job_ids = submit_arrays(fsf_files, str(script), chunk_size, max_concurrent, str(tmp / "manifests"))
+            calls = sbatch_calls()
+
+        chunks = [fsf_files[i:i + chunk_size] for i in range(0, n_files, chunk_size)]
+        manifests = sorted((tmp / "manifests").glob("*.txt"))
+        return _report({
+            "one sbatch call per chunk": len(calls) == len(chunks) and job_ids == [str(i + 1) for i in range(len(chunks))],
+            "--array=0-(n-1)%N per chunk": [call.split()[:2] for call in calls]
+                == [["--parsable", f"--array=0-{len(chunk) - 1}%{max_concurrent}"] for chunk in chunks],
+            "manifests list each chunk's files": [m.read_text().splitlines() for m in manifests]
+                == [[os.path.abspath(f) for f in chunk] for chunk in chunks],
+            "array scripts keep the #SBATCH lines": all(
+                "#SBATCH --mem=8G" in m.with_suffix(".sh").read_text() for m in manifests),
+        })
+
+def check_imports():
+    """
+    plan_imports() and submit_imports() on a small import log: each project
+    resolved once; repeated rows, rows without a Flywheel label, studies not
+    in the config and sessions with a DICOM directory left out; each planned
+    import submitted once.
+    """
+    studies_cfg = {
+        "studyA": {"project_path": "lab/studyA", "cluster_id_slice": [3, 7]},
+        "studyB": {"project_path": "lab/studyB", "cluster_id_slice": [3, 7]},
+    }
+    fw = FakeFlywheel({
+        "lab/studyA": ["ABC1234_01", "ABC1234_02", "ABC5678_01"],
+        "lab/studyB": ["XYZ9999_01"],
+    })
+    df = pd.DataFrame([
+        ("studyA", "P00001234", "S0001"),
+        ("studyA", "P00001234", "S0001"),  # repeated row
+        ("studyA", "P00001234", "S0002"),  # DICOM directory already there
+        ("studyA", "P00005678", "S0001"),
+        ("studyA", "P00004321", "S0001"),  # no Flywheel label
+        ("studyB", "P00009999", "S0001"),
+        ("studyC", "P00000001", "S0001"),  # study not in the config
+    ], columns=["study", "subid", "session"])
+    expected = [("studyA", "P00001234", "S0001", "ABC1234_01"),
+                ("studyA", "P00005678", "S0001", "ABC5678_01"),
+                ("studyB", "P00009999", "S0001", "XYZ9999_01")]
+
+    with TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "data" / "studyA" / "P00001234" / "S0002" / "DICOM").mkdir(parents=True)
+        jobs = flywheel_import.plan_imports(df, studies_cfg, fw, data_root=str(tmp))
+        with stub_sbatch(tmp) as sbatch_calls:
+            job_ids = flywheel_import.submit_imports(jobs, str(tmp / "out"), str(tmp / "err"), "flywheel_import.sh",
+                                                     workers=2)
+            calls = sbatch_calls()
+
+    return _report({
+        "one resolve per project": fw.resolved == ["lab/studyA", "lab/studyB"],
+        "repeated, unlabelled and imported sessions dropped":
+            [(j["study"], j["cluster_id"], j["session"], j["label"]) for j in jobs] == expected,
+        # the last five sbatch arguments are the script's: study, cluster_id, session, project_path, label
+        "one sbatch call per import": len(job_ids) == len(expected)
+            and sorted(call.split()[-5:] for call in calls)
+            == sorted([study, cluster_id, session, studies_cfg[study]["project_path"], label]
+                      for study, cluster_id, session, label in expected),
+    })
+
+if __name__ == "__main__":
+    results = [check() for check in (check_arrays, check_imports)]
+    raise SystemExit(0 if all(results) else 1)
@@ -1,29 +1,219 @@
+import argparse
 import glob
+import gzip
 import nibabel as nib
+import numpy as np
 import os
-import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def extract_middle_slice(input_file, output_file):
+# Memory budget for chunked reads of one image
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+REDUCTIONS = ("mean", "median")
+
+def _is_unscaled_nifti(img, input_file):
+    if not isinstance(img, (nib.Nifti1Image, nib.Nifti2Image)) or not input_file.endswith((".nii", ".nii.gz")):
+        return False
+    slope, inter = img.dataobj.slope, img.dataobj.inter
+    return slope == 1 and inter == 0
+
+def iter_volume_chunks(img, input_file, start, stop, max_bytes=DEFAULT_MAX_BYTES):
     """
-    Extract the middle 3D volume from a 4D NIfTI file and save it.
+    Volumes start..stop-1 of a 4D image, yielded as 4D arrays of as many
+    consecutive volumes as fit in max_bytes (at least one). Unscaled
+    single-file NIfTIs are read directly: memory-mapped for .nii, one forward
+    decompression stream for .nii.gz. Anything else goes through the array proxy.
     """
-    img = nib.load(input_file)
+    # the array proxy knows where the voxel data starts and how it is stored
+    shape = img.shape[:3]
+    dtype = img.dataobj.dtype
+    volume_bytes = dtype.itemsize * int(np.prod(shape))
+    per_chunk = max(1, max_bytes // volume_bytes)
+    starts = range(start, stop, per_chunk)
 
-    if len(img.shape) == 4:
-        middle_index = img.shape[-1] // 2
-        middle_slice = img.slicer[..., middle_index]
-        nib.save(middle_slice, output_file)
+    if not _is_unscaled_nifti(img, input_file):
+        for a in starts:
+            yield np.asanyarray(img.dataobj[..., a:min(a + per_chunk, stop)])
+        return
+
+    offset = int(img.dataobj.offset) + start * volume_bytes
+    if input_file.endswith(".gz"):
+        with gzip.open(input_file, "rb") as f:
+            f.seek(offset)
+            for a in starts:
+                n = min(per_chunk, stop - a)
+                data = np.frombuffer(f.read(n * volume_bytes), dtype=dtype)
+                yield data.reshape(shape + (n,), order="F").copy()
+        return
+
+    data = np.memmap(input_file, dtype=dtype, mode="r", offset=offset, shape=shape + (stop - start,), order="F")
+    for a in starts:
+        yield np.array(data[..., a - start:a - start + per_chunk])
+
+def read_volume(img, input_file, index):
+    """
+    One 3D volume of a 4D single-file NIfTI without decoding the others.
+    .nii files are memory-mapped at the volume's byte offset; .nii.gz files
+    are decompressed as a stream only up to the end of that volume.
+    """
+    return next(iter_volume_chunks(img, input_file, index, index + 1))[..., 0]
+
+def read_volumes(img, input_file, indices, max_bytes=DEFAULT_MAX_BYTES):
+    """The given volumes stacked into a 4D array; runs of consecutive indices are read as chunks."""
+    runs = []
+    for i in indices:
+        if runs and i == runs[-1][1]:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return np.concatenate([chunk for start, stop in runs
+                           for chunk in iter_volume_chunks(img, input_file, start, stop, max_bytes)], axis=3)
+
+def mean_volume(img, input_file, max_bytes=DEFAULT_MAX_BYTES):
+    """Temporal mean of a 4D image, summed chunk by chunk in float64."""
+    total = np.zeros(img.shape[:3])
+    for chunk in iter_volume_chunks(img, input_file, 0, img.shape[3], max_bytes):
+        total += chunk.sum(axis=3, dtype=np.float64)
+    return total / img.shape[3]
+
+def median_volume(img, input_file, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Temporal median of a 4D image, taken over slabs of slices that fit in
+    max_bytes. Unscaled .nii files are memory-mapped as they are; anything
+    else is first streamed once into a temporary uncompressed file, so a
+    .nii.gz is not decompressed again for every slab.
+    """
+    nx, ny, nz, nt = img.shape
+    slab = max(1, max_bytes // (nx * ny * nt * 8))
+    out = np.empty((nx, ny, nz))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if _is_unscaled_nifti(img, input_file) and not input_file.endswith(".gz"):
+            series = np.memmap(input_file, dtype=img.dataobj.dtype, mode="r",
+                               offset=int(img.dataobj.offset), shape=img.shape, order="F")
+        else:
+            dtype = img.dataobj.dtype if _is_unscaled_nifti(img, input_file) else np.float64
+            series = np.memmap(os.path.join(tmp, "series.dat"), dtype=dtype, mode="w+", shape=img.shape, order="F")
+            t = 0
+            for chunk in iter_volume_chunks(img, input_file, 0, nt, max_bytes):
+                series[..., t:t + chunk.shape[3]] = chunk
+                t += chunk.shape[3]
+
+        for z in range(0, nz, slab):
+            out[:, :, z:z + slab] = np.median(np.asarray(series[:, :, z:z + slab, :]), axis=3)
+        del series
+    return out
+
+def parse_selection(selection, n_volumes):
+    """
+    Volume indices picked by a selection, or the name of a reduction.
+    Selections are 'middle', an index ('5', '-1'), a slice ('10:20', '::2'),
+    a comma-separated list ('0,3,7'), 'mean' or 'median'.
+    """
+    selection = selection.strip().lower()
+    if selection in REDUCTIONS:
+        return selection
+    if selection == "middle":
+        return [n_volumes // 2]
+    volumes = range(n_volumes)
+    if ":" in selection:
+        indices = list(volumes[slice(*[int(p) if p else None for p in selection.split(":")])])
     else:
+        indices = [volumes[int(p)] for p in selection.split(",")]
+    if not indices:
+        raise ValueError(f"Selection {selection!r} picks no volumes out of {n_volumes}")
+    return indices
+
+def extract_volumes(input_file, output_file, selection="middle", max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Save the selected volumes of a 4D NIfTI file: a 3D image for a single
+    index or a mean/median (as float32), a 4D image for several indices.
+    """
+    img = nib.load(input_file)
+
+    if len(img.shape) != 4:
         print(f"Skipping {input_file}: not a 4D image")
+        return
+
+    picked = parse_selection(selection, img.shape[3])
+    if picked in REDUCTIONS:
+        reduce = mean_volume if picked == "mean" else median_volume
+        out = img.__class__(reduce(img, input_file, max_bytes).astype(np.float32), img.affine, img.header)
+        out.set_data_dtype(np.float32)
+    elif len(picked) == 1 and _is_unscaled_nifti(img, input_file):
+        out = img.__class__(read_volume(img, input_file, picked[0]), img.affine, img.header)
+    elif len(picked) == 1:
+        out = img.slicer[..., picked[0]]
+    else:
+        out = img.__class__(read_volumes(img, input_file, picked, max_bytes), img.affine, img.header)
+    nib.save(out, output_file)
+
+def extract_middle_slice(input_file, output_file):
+    """
+    Extract the middle 3D volume from a 4D NIfTI file and save it.
+    """
+    extract_volumes(input_file, output_file, "middle")
+
+def output_prefix(selection):
+    """middle_slice_, mean_, median_ or vol<selection>_ for output file names."""
+    selection = selection.strip().lower()
+    if selection == "middle":
+        return "middle_slice_"
+    if selection in REDUCTIONS:
+        return selection + "_"
+    return "vol" + selection.replace(":", "-").replace(",", "_") + "_"
+
+def mirrored_output(nii_file, input_root, output_dir, prefix="middle_slice_"):
+    """output_dir/<path of nii_file below input_root>/<prefix><name>"""
+    rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(nii_file)), input_root)
+    return os.path.join(output_dir, rel_dir, prefix + os.path.basename(nii_file))
+
+def extract_batch(input_pattern, output_dir, workers=None, selection="middle", max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Extract the selected volumes of every file matching input_pattern across
+    a process pool. Outputs go under output_dir, mirroring the directory
+    layout below the deepest folder common to all inputs, so files that share
+    a basename do not overwrite each other.
+    """
+    nii_files = sorted(glob.glob(input_pattern, recursive=True))
+    if not nii_files:
+        print(f"No files match {input_pattern}")
+        return
+    input_root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in nii_files])
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for nii_file in nii_files:
+            output_file = mirrored_output(nii_file, input_root, output_dir, output_prefix(selection))
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            futures[pool.submit(extract_volumes, nii_file, output_file, selection, max_bytes)] = nii_file
+        for future in as_completed(futures):
+            nii_file = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Failed to extract {nii_file}: {e}")
 
-def main(input_pattern):
+def main(input_pattern, selection="middle", max_bytes=DEFAULT_MAX_BYTES):
     for nii_file in glob.glob(input_pattern):
-        output_file = "middle_slice_" + os.path.basename(nii_file)
-        extract_middle_slice(nii_file, output_file)
+        output_file = output_prefix(selection) + os.path.basename(nii_file)
+        extract_volumes(nii_file, output_file, selection, max_bytes)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python extract_middle_slice.py '<input_glob_pattern>'")
-    else:
-        main(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Extract volumes (by default the middle one) from 4D NIfTI images.")
+    parser.add_argument("input_pattern", help="glob of input images, quoted, e.g. 'data/**/*.nii.gz'")
+    parser.add_argument("--select", default="middle",
+                        help="middle (default), an index (5), a range (10:20), a list (0,3,7), mean or median")
+    parser.add_argument("--max-memory-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help=f"memory budget per image for chunked reads (default {DEFAULT_MAX_BYTES // 1024 ** 2})")
+    parser.add_argument("--output-dir",
+                        help="batch mode: write outputs here, mirroring the input layout, using a process pool")
+    parser.add_argument("--workers", type=int, default=None, help="processes for batch mode (default: all cores)")
+    args = parser.parse_args()
 
+    max_bytes = args.max_memory_mb * 1024 ** 2
+    if args.output_dir:
+        extract_batch(args.input_pattern, args.output_dir, args.workers, args.select, max_bytes)
+    else:
+        main(args.input_pattern, args.select, max_bytes)
@@ -1,88 +1,238 @@
 import os
 import glob
 import json
+import re
+import sqlite3
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import nibabel as nib
+from nibabel.openers import ImageOpener
 from pathlib import Path
 
-# Load config
-with open("config.json") as f:
-    cfg = json.load(f)
-
-csv_file = cfg["csv_file"]
-study_name = cfg["study_name"]
-processing_dir = cfg["processing_dir"]
-slice_timing_file = os.path.join(processing_dir, cfg["slice_timing_file"])
-template_file = os.path.join(processing_dir, cfg["template_file"])
-event_timing_dir = os.path.join(processing_dir, cfg["event_timing_dir"])
-t1_patterns = cfg["t1_search_patterns"]
-
-# Load study data
-df = pd.read_csv(csv_file)
-df_study = df[df["Study"] == study_name]
-
-for _, row in df_study.iterrows():
-    func_file = row["Path"]
-    output_dir = os.path.dirname(os.path.dirname(func_file))
-    taskname = row["Task"]
-    subject = row["SubjectID"]
-    session = row["Session"]
-
-    # Ensure fsl5 dir exists
-    fsl5_dir = os.path.join(os.path.dirname(func_file), "fsl5")
-    os.makedirs(fsl5_dir, exist_ok=True)
-    output = os.path.join(fsl5_dir, taskname)
-
-    # Read image header info
-    img = nib.load(func_file)
-    hdr = img.header
-    zooms = hdr.get_zooms()
-    if len(zooms) <= 3:
-        raise ValueError(f"Missing TR info in header for file {func_file}")
-    tr = zooms[3]
-    nvols = img.shape[3] if len(img.shape) > 3 else None
-    nvox = img.shape[0] * img.shape[1] * img.shape[2]
-
-    # Find T1 file using patterns from config
-    t1file = ""
-    subject_dir = os.path.dirname(output_dir)
-    session_prefix = session[:4]
-    for pattern in t1_patterns:
-        search_pattern = pattern.format(
-            output_dir=output_dir,
-            subject_dir=subject_dir,
-            subject=subject,
-            session_prefix=session_prefix
+PLACEHOLDERS = ("output", "tr", "nvols", "nvox", "stfile", "func", "t1", "taskname", "evfile")
+
+def read_nifti_header(path):
+    """
+    Zooms and shape from the NIfTI header alone; only the first few hundred
+    bytes are read (and decompressed, for .nii.gz).
+    """
+    with ImageOpener(path) as f:
+        sizeof_hdr = struct.unpack("<i", f.read(4))[0]
+        f.seek(0)
+        # sizeof_hdr is 348 for NIfTI-1 and 540 for NIfTI-2, in either byte order
+        if sizeof_hdr in (540, struct.unpack(">i", struct.pack("<i", 540))[0]):
+            hdr = nib.Nifti2Header.from_fileobj(f)
+        else:
+            hdr = nib.Nifti1Header.from_fileobj(f)
+    return hdr.get_zooms(), tuple(int(n) for n in hdr.get_data_shape())
+
+class HeaderIndex:
+    """
+    Persistent SQLite index of NIfTI header info and T1 lookups.
+
+    Headers are keyed by path and reused while the file's mtime and size are
+    unchanged. T1 lookups are keyed by the expanded search patterns; found
+    files are remembered across runs as long as they still exist, misses only
+    for the current run so newly converted T1s are picked up next time. A hit
+    from a later pattern is only reused while the earlier patterns still
+    match nothing.
+    """
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS headers "
+            "(path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, zooms TEXT, shape TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS t1_lookups (patterns TEXT PRIMARY KEY, t1file TEXT, pattern_index INTEGER)"
         )
-        candidates = glob.glob(search_pattern)
-        if candidates:
-            t1file = candidates[0]
-            break
-
-    if not t1file:
-        print(f"No T1 file found for subject {subject}, session {session}")
-        continue
-
-    # Load FSF template
-    template = Path(template_file).read_text()
-
-    # Replace placeholders
-    out_text = (
-        template.replace("@output@", output)
-                .replace("@tr@", str(tr))
-                .replace("@nvols@", str(nvols))
-                .replace("@nvox@", str(nvox))
-                .replace("@stfile@", slice_timing_file)
-                .replace("@func@", func_file)
-                .replace("@t1@", t1file)
-                .replace("@taskname@", taskname)
-                .replace("@evfile@", os.path.join(event_timing_dir, f"{taskname}.txt"))
-    )
-
-    # Write new FSF file
-    out_file = os.path.join(fsl5_dir, f"{taskname}.fsf")
+        self.t1_misses = set()
+
+    def header(self, path):
+        """
+        (zooms, shape) for path, read from the file only if it changed. Zooms
+        are float32 as in the header, so str(tr) matches nib.load's.
+        """
+        return self.headers([path])[path]
+
+    def headers(self, paths, workers=8):
+        """header() for many paths, with changed files read in a thread pool."""
+        paths = list(dict.fromkeys(paths))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            stats = dict(zip(paths, pool.map(os.stat, paths)))
+
+        found, stale = {}, []
+        for path in paths:
+            row = self.conn.execute(
+                "SELECT mtime_ns, size, zooms, shape FROM headers WHERE path = ?", (path,)
+            ).fetchone()
+            if row and row[0] == stats[path].st_mtime_ns and row[1] == stats[path].st_size:
+                found[path] = json.loads(row[2]), json.loads(row[3])
+            else:
+                stale.append(path)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, (zooms, shape) in zip(stale, pool.map(read_nifti_header, stale)):
+                zooms = [float(z) for z in zooms]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?, ?)",
+                    (path, stats[path].st_mtime_ns, stats[path].st_size, json.dumps(zooms), json.dumps(shape)),
+                )
+                found[path] = zooms, shape
+
+        return {path: (tuple(np.float32(z) for z in zooms), tuple(shape)) for path, (zooms, shape) in found.items()}
+
+    def find_t1(self, search_patterns):
+        """First match of the first search pattern that matches anything, or ''."""
+        key = "\n".join(search_patterns)
+        if key in self.t1_misses:
+            return ""
+        row = self.conn.execute(
+            "SELECT t1file, pattern_index FROM t1_lookups WHERE patterns = ?", (key,)
+        ).fetchone()
+        cached = row[0] if row and os.path.exists(row[0]) else None
+        # a cached hit stands unless one of the patterns ahead of it now matches
+        remaining = search_patterns[:row[1]] if cached else search_patterns
+
+        for i, pattern in enumerate(remaining):
+            candidates = glob.glob(pattern)
+            if candidates:
+                self.conn.execute("INSERT OR REPLACE INTO t1_lookups VALUES (?, ?, ?)", (key, candidates[0], i))
+                return candidates[0]
+        if cached:
+            return cached
+        self.t1_misses.add(key)
+        return ""
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+class FsfTemplate:
+    """
+    An .fsf template split once into literal text and @placeholder@ slots,
+    so rendering is a single join instead of a str.replace pass per field.
+    """
+    pattern = re.compile("@(" + "|".join(PLACEHOLDERS) + ")@")
+
+    def __init__(self, text):
+        parts = self.pattern.split(text)
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+
+    @classmethod
+    def from_file(cls, template_file):
+        return cls(Path(template_file).read_text())
+
+    def render(self, values):
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            out.append(values[field])
+            out.append(literal)
+        return "".join(out)
+
+def write_if_changed(out_file, text):
+    """Write text to out_file unless it already holds exactly that. Returns True if written."""
+    try:
+        with open(out_file) as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
     with open(out_file, "w") as f:
-        f.write(out_text)
+        f.write(text)
+    return True
+
+def generate_fsfs(cfg, index):
+    csv_file = cfg["csv_file"]
+    study_name = cfg["study_name"]
+    processing_dir = cfg["processing_dir"]
+    slice_timing_file = os.path.join(processing_dir, cfg["slice_timing_file"])
+    template_file = os.path.join(processing_dir, cfg["template_file"])
+    event_timing_dir = os.path.join(processing_dir, cfg["event_timing_dir"])
+    t1_patterns = cfg["t1_search_patterns"]
+
+    workers = cfg.get("workers", 8)
+
+    # Load FSF template once
+    template = FsfTemplate.from_file(template_file)
+
+    # Load study data
+    df = pd.read_csv(csv_file)
+    df_study = df[df["Study"] == study_name]
+
+    # Read image header info for every run up front
+    headers = index.headers(df_study["Path"].tolist(), workers)
+
+    jobs = []
+    for _, row in df_study.iterrows():
+        func_file = row["Path"]
+        output_dir = os.path.dirname(os.path.dirname(func_file))
+        taskname = row["Task"]
+        subject = row["SubjectID"]
+        session = row["Session"]
+
+        # Ensure fsl5 dir exists
+        fsl5_dir = os.path.join(os.path.dirname(func_file), "fsl5")
+        os.makedirs(fsl5_dir, exist_ok=True)
+
+        zooms, shape = headers[func_file]
+        if len(zooms) <= 3:
+            raise ValueError(f"Missing TR info in header for file {func_file}")
+        tr = zooms[3]
+        nvols = shape[3] if len(shape) > 3 else None
+        nvox = shape[0] * shape[1] * shape[2]
+
+        # Find T1 file using patterns from config
+        subject_dir = os.path.dirname(output_dir)
+        session_prefix = session[:4]
+        search_patterns = [
+            pattern.format(
+                output_dir=output_dir,
+                subject_dir=subject_dir,
+                subject=subject,
+                session_prefix=session_prefix
+            )
+            for pattern in t1_patterns
+        ]
+        t1file = index.find_t1(search_patterns)
+
+        if not t1file:
+            print(f"No T1 file found for subject {subject}, session {session}")
+            continue
+
+        values = {
+            "output": os.path.join(fsl5_dir, taskname),
+            "tr": str(tr),
+            "nvols": str(nvols),
+            "nvox": str(nvox),
+            "stfile": slice_timing_file,
+            "func": func_file,
+            "t1": t1file,
+            "taskname": taskname,
+            "evfile": os.path.join(event_timing_dir, f"{taskname}.txt"),
+        }
+        out_file = os.path.join(fsl5_dir, f"{taskname}.fsf")
+        jobs.append((f"{subject} {session} {taskname}", out_file, values))
+
+    # Render and write new FSF files
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        written = pool.map(lambda job: write_if_changed(job[1], template.render(job[2])), jobs)
+        for (label, out_file, _), changed in zip(jobs, written):
+            if changed:
+                print(f"Generated FSF for {label}: {out_file}")
+            else:
+                print(f"Unchanged FSF for {label}: {out_file}")
 
-    print(f"Generated FSF for {subject} {session} {taskname}: {out_file}")
+if __name__ == "__main__":
+    # Load config
+    with open("config.json") as f:
+        cfg = json.load(f)
 
+    index = HeaderIndex(cfg.get("header_index", "nifti_header_index.sqlite"))
+    try:
+        generate_fsfs(cfg, index)
+    finally:
+        index.close()
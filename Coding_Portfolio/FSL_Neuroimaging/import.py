@@ -1,13 +1,93 @@
+import argparse
 import os
 import subprocess
 import pandas as pd
-import flywheel
 import json
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-load_dotenv()
+import_script = "./scripts/flywheel_import.sh"
 
-def import_flywheel(config_path="config.json"):
+def index_project(project, cluster_slice):
+    """
+    Map (cluster_id, session) to the Flywheel label for every child of a
+    project, so rows can be matched with a lookup instead of a rescan.
+    """
+    index = {}
+    for elem in project.children:
+        ID = elem.label
+        key = ("P0000" + ID[cluster_slice], "S00" + ID[-2:])
+        if key in index:
+            print(f"Duplicate Flywheel label for {key[0]} {key[1]}: keeping {index[key]}, ignoring {ID}")
+            continue
+        index[key] = ID
+    return index
+
+def plan_imports(df, studies_cfg, fw, data_root="."):
+    """
+    Imports still needed for the rows of df: one entry per (study, cluster_id,
+    session) that has a Flywheel label and no DICOM directory yet. Each
+    project's children are fetched once, however many rows refer to it.
+    """
+    indexes = {}
+    jobs = {}
+    for _, row in df.iterrows():
+        study_name = row["study"]
+        if study_name not in studies_cfg:
+            continue
+
+        cfg = studies_cfg[study_name]
+        if study_name not in indexes:
+            indexes[study_name] = index_project(fw.resolve(cfg["project_path"]), slice(*cfg["cluster_id_slice"]))
+
+        key = (row["subid"], row["session"])
+        ID = indexes[study_name].get(key)
+        if ID is None or (study_name, *key) in jobs:
+            continue
+
+        dicom_dir = os.path.join(data_root, "data", study_name, key[0], key[1], "DICOM")
+        if os.path.exists(dicom_dir):
+            continue  # Already imported
+
+        jobs[(study_name, *key)] = {
+            "study": study_name,
+            "cluster_id": key[0],
+            "session": key[1],
+            "project_path": cfg["project_path"],
+            "label": ID,
+        }
+    return list(jobs.values())
+
+def submit_import(job, output_log, error_log, script=import_script):
+    """sbatch one import job; returns the CompletedProcess."""
+    name = f"import_{job['cluster_id']}_{job['session']}"
+    return subprocess.run(
+        ["sbatch", "-o", f"{output_log}/{name}.out", "-e", f"{error_log}/{name}.err", "--parsable",
+         script, job["study"], job["cluster_id"], job["session"], job["project_path"], job["label"]],
+        capture_output=True,
+        text=True
+    )
+
+def submit_imports(jobs, output_log, error_log, script=import_script, workers=4):
+    """Submit jobs with at most workers sbatch calls in flight. Returns the job IDs."""
+    job_ids = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(submit_import, job, output_log, error_log, script): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            label = f"{job['study']} {job['cluster_id']} {job['session']}"
+            try:
+                result = future.result()
+            except OSError as e:
+                print(f"Failed to submit import for {label}: {e}")
+                continue
+            if result.returncode == 0:
+                job_ids.append(result.stdout.strip())
+                print(f"Submitted import for {label}: {result.stdout.strip()}")
+            else:
+                print(f"Failed to submit import for {label}: {result.stderr.strip()}")
+    return job_ids
+
+def import_flywheel(config_path="config.json", fw=None, dry_run=False):
     # Load config
     with open(config_path) as f:
         config = json.load(f)
@@ -22,37 +102,26 @@ def import_flywheel(config_path="config.json"):
 
     studies_cfg = config.get("studies", {})
 
-    fw = flywheel.Client(os.getenv("FLYWHEEL_API_KEY"))
-
-    for _, row in df.iterrows():
-        study_name = row["study"]
-        if study_name not in studies_cfg:
-            continue
-
-        cfg = studies_cfg[study_name]
-        project_path = cfg["project_path"]
-        cluster_slice = slice(*cfg["cluster_id_slice"])
-
-        project = fw.resolve(project_path)
-
-        for elem in project.children:
-            ID = elem.label
-            cluster_id = "P0000" + ID[cluster_slice]
-            flywheel_session = "S00" + ID[-2:]
+    if fw is None:
+        # only needed for a real client, so the planning can be checked without the Flywheel SDK
+        import flywheel
+        from dotenv import load_dotenv
+        load_dotenv()
+        fw = flywheel.Client(os.getenv("FLYWHEEL_API_KEY"))
 
-            if row["subid"] == cluster_id and row["session"] == flywheel_session:
-                dicom_dir = os.path.join(".", "data", study_name, cluster_id, row["session"], "DICOM")
-                if os.path.exists(dicom_dir):
-                    continue  # Already imported
+    jobs = plan_imports(df, studies_cfg, fw)
+    if dry_run:
+        for job in jobs:
+            print(f"Would import {job['study']} {job['cluster_id']} {job['session']} from {job['label']}")
+        return jobs
 
-                import_cmd = (
-                    f"sbatch -o {output_log}/import_{cluster_id}_{row['session']}.out "
-                    f"-e {error_log}/import_{cluster_id}_{row['session']}.err --parsable "
-                    f"./scripts/flywheel_import.sh {study_name} {cluster_id} {row['session']} {project_path} {ID}"
-                )
-                subprocess.Popen(import_cmd, shell=True, stdout=subprocess.PIPE, text=True).communicate()
+    return submit_imports(jobs, output_log, error_log, config.get("import_script", import_script),
+                          config.get("submit_workers", 4))
 
 if __name__ == "__main__":
-    import_flywheel()
-
+    parser = argparse.ArgumentParser(description="Submit Flywheel imports for sessions without a DICOM directory.")
+    parser.add_argument("--config", default="config.json", help="config file (default config.json)")
+    parser.add_argument("--dry-run", action="store_true", help="print the planned imports without submitting")
+    args = parser.parse_args()
 
+    import_flywheel(args.config, dry_run=args.dry_run)
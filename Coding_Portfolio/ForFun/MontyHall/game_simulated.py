@@ -1,6 +1,19 @@
+import argparse
 import random
+import sys
+from functools import partial
+from pathlib import Path
+import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from montecarlo import run_monte_carlo
+
+STRATEGIES = ("switch", "stay", "random")
+
+# Trials per batch, so 10^8 trials never hold more than a few arrays of this length
+BATCH_SIZE = 10_000_000
+
 def simulate_monty_hall(switch=False):
     prizes = [False, False, True]  # False = goat, True = car
     random.shuffle(prizes)
@@ -12,33 +25,136 @@ def simulate_monty_hall(switch=False):
     outcome = prizes[player_choice]
     return outcome  # True for win, False for lose
 
-if __name__ == '__main__':
-    num_simulations = 1234
+def simulate_batch(n_trials, n_doors=3, n_reveal=1, strategy="switch", rng=None):
+    """
+    Boolean win array for n_trials games with n_doors doors, where the host
+    opens n_reveal goat doors the player did not pick, and the player then:
+      stay   - keeps the first pick
+      switch - moves to one of the other unopened doors at random
+      random - picks again among all unopened doors, the first pick included
+
+    The car and first pick are drawn per trial. The host never opens the car,
+    so when the first pick is a goat the car is one of the other unopened
+    doors, and a random move lands on it with probability 1/(unopened others);
+    that move is drawn as a single integer instead of laying out every door.
+    """
+    if not 0 <= n_reveal <= n_doors - 2:
+        raise ValueError(f"The host can open 0 to {n_doors - 2} of {n_doors} doors, not {n_reveal}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+    rng = np.random.default_rng(rng)
+
+    car = rng.integers(n_doors, size=n_trials)
+    choice = rng.integers(n_doors, size=n_trials)
+    first_pick_wins = car == choice
+    others = n_doors - 1 - n_reveal
+
+    if strategy == "stay":
+        return first_pick_wins
+    if strategy == "switch":
+        return ~first_pick_wins & (rng.integers(others, size=n_trials) == 0)
+    # random: index 0 is the first pick, 1..others the other unopened doors
+    pick = rng.integers(others + 1, size=n_trials)
+    return np.where(pick == 0, first_pick_wins, ~first_pick_wins & (pick == 1))
 
-    # Switching strategy
-    switch_wins = 0
-    for _ in range(num_simulations):
-        result = simulate_monty_hall(switch=True)
-        switch_wins += result
+def count_wins(n_trials, n_doors=3, n_reveal=1, strategy="switch", rng=None, batch_size=BATCH_SIZE):
+    """Number of wins in n_trials games, simulated in batches of batch_size."""
+    rng = np.random.default_rng(rng)
+    wins = 0
+    for start in range(0, n_trials, batch_size):
+        wins += int(simulate_batch(min(batch_size, n_trials - start), n_doors, n_reveal, strategy, rng).sum())
+    return wins
+
+def exact_win_rate(n_doors=3, n_reveal=1, strategy="switch"):
+    """Win probability of a strategy, for checking the simulation."""
+    others = n_doors - 1 - n_reveal
+    if strategy == "stay":
+        return 1 / n_doors
+    if strategy == "switch":
+        return (n_doors - 1) / n_doors / others
+    return 1 / (others + 1)
+
+def wilson_interval(wins, n_trials, z=1.96):
+    """Wilson score interval for a win rate (z=1.96 for 95%)."""
+    p = wins / n_trials
+    denom = 1 + z ** 2 / n_trials
+    center = (p + z ** 2 / (2 * n_trials)) / denom
+    half = z * np.sqrt(p * (1 - p) / n_trials + z ** 2 / (4 * n_trials ** 2)) / denom
+    return center - half, center + half
+
+def summarize(strategy, wins, n_trials, z=1.96):
+    low, high = wilson_interval(wins, n_trials, z)
+    return {"strategy": strategy, "trials": n_trials, "wins": wins,
+            "win_rate": wins / n_trials, "ci_low": low, "ci_high": high}
+
+def run_strategies(n_trials, n_doors=3, n_reveal=1, strategies=("switch", "stay"), seed=None,
+                   workers=None, target_ci_width=None):
+    """
+    summarize() for each strategy, each played up to n_trials times across
+    workers processes (stopping early once the win rate's 95% interval is
+    target_ci_width wide). Each strategy gets its own stream from seed.
+    """
+    results = []
+    for strategy, stream in zip(strategies, np.random.SeedSequence(seed).spawn(len(strategies))):
+        game = partial(simulate_batch, n_doors=n_doors, n_reveal=n_reveal, strategy=strategy)
+        summary = run_monte_carlo(game, n_trials, workers=workers, seed=stream, target_ci_width=target_ci_width)
+        results.append(summarize(strategy, int(round(summary.mean * summary.count)), summary.count))
+    return results
+
+def parity_check(n_trials=100_000, seed=None, z=4.0):
+    """
+    Compare the batched simulator with simulate_monty_hall on the classic
+    3-door game: for each of switch/stay, the two win rates must agree within
+    z standard errors. Returns True if both do.
+    """
+    random.seed(seed)
+    ok = True
+    for strategy in ("switch", "stay"):
+        scalar = sum(simulate_monty_hall(switch=strategy == "switch") for _ in range(n_trials)) / n_trials
+        batch = count_wins(n_trials, strategy=strategy, rng=seed) / n_trials
+        p = (scalar + batch) / 2
+        se = np.sqrt(2 * p * (1 - p) / n_trials)
+        agree = abs(scalar - batch) <= z * se
+        ok &= agree
+        print(f"{strategy}: scalar {scalar:.4f}, batched {batch:.4f}, "
+              f"exact {exact_win_rate(strategy=strategy):.4f} -> {'ok' if agree else 'MISMATCH'}")
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate the Monty Hall problem.")
+    parser.add_argument("--trials", type=int, default=1234, help="games per strategy (default 1234)")
+    parser.add_argument("--doors", type=int, default=3)
+    parser.add_argument("--reveal", type=int, default=1, help="goat doors the host opens (default 1)")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=["switch", "stay"])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--ci-width", type=float, default=None,
+                        help="stop a strategy early once its 95%% interval is this wide, e.g. 0.001")
+    parser.add_argument("--check", action="store_true", help="compare the batched and scalar simulators and exit")
+    args = parser.parse_args()
 
-    print(f"Out of {num_simulations} simulations, the player won {switch_wins} times switching.")
+    if args.check:
+        raise SystemExit(0 if parity_check(seed=args.seed) else 1)
 
-    # Staying strategy
-    stay_wins = 0
-    for _ in range(num_simulations):
-        result = simulate_monty_hall(switch=False)
-        stay_wins += result
+    num_simulations = args.trials
+    results = run_strategies(num_simulations, args.doors, args.reveal, args.strategies, args.seed,
+                             args.workers, args.ci_width)
 
-    print(f"Out of {num_simulations} simulations, the player won {stay_wins} times staying.")
+    for r in results:
+        print(f"Out of {r['trials']} simulations, the player won {r['wins']} times using '{r['strategy']}' "
+              f"({r['win_rate']:.4f}, 95% CI {r['ci_low']:.4f}-{r['ci_high']:.4f}, "
+              f"exact {exact_win_rate(args.doors, args.reveal, r['strategy']):.4f}).")
 
     fig, ax = plt.subplots()
 
-    strategies = ['switch', 'stay']
-    counts = [switch_wins, stay_wins]
-    colors = ['tab:blue', 'tab:red']
+    strategies = [r["strategy"] for r in results]
+    counts = [r["win_rate"] for r in results]
+    errors = [[r["win_rate"] - r["ci_low"] for r in results],
+              [r["ci_high"] - r["win_rate"] for r in results]]
+    colors = ['tab:blue', 'tab:red', 'tab:green'][:len(results)]
 
-    ax.bar(strategies, counts, color=colors)
-    ax.set_ylabel('Number of Wins')
-    ax.set_title(f'Monty Hall Simulation ({num_simulations} iterations)')
+    ax.bar(strategies, counts, yerr=errors, capsize=4, color=colors)
+    ax.set_ylabel('Win Rate')
+    ax.set_title(f'Monty Hall Simulation ({num_simulations} iterations, {args.doors} doors)')
 
     plt.savefig("simulated.png")
@@ -0,0 +1,110 @@
+"""
+Drop tables described in JSON or YAML, so other bosses can be simulated
+without editing itemDropRate.py. A spec looks like:
+
+    {
+      "name": "Araxxor",
+      "table_chance": "1/150",
+      "items": {"Noxious_blade": 0.75, "Noxious_point": 0.75,
+                "Noxious_pommel": 0.75, "Araxyte_fang": 0.25},
+      "collect": ["Noxious_blade", "Noxious_point", "Noxious_pommel", "Araxyte_fang"],
+      "rules": [
+        {"type": "no_duplicates_until_complete",
+         "items": ["Noxious_blade", "Noxious_point", "Noxious_pommel"]}
+      ]
+    }
+
+table_chance is the chance per kill of rolling the table, as a number or
+"a/b". collect lists the items the hunt is for (default: all of them).
+Rules decide which items can drop given what is already owned:
+
+    no_duplicates_until_complete  owned items of the set cannot drop again
+                                  until every item of the set is owned
+    unique                        the items never drop again once owned
+    requires                      item can only drop once every item in
+                                  "after" is owned
+"""
+import json
+from fractions import Fraction
+from pathlib import Path
+import numpy as np
+
+RULE_TYPES = ("no_duplicates_until_complete", "unique", "requires")
+
+def parse_chance(value):
+    """A probability given as a number or a fraction string like '1/150'."""
+    return float(Fraction(value)) if isinstance(value, str) else float(value)
+
+def alias_table(weights):
+    """
+    Vose alias table for sampling index i with probability proportional to
+    weights[i] in O(1): pick a column k uniformly, keep it if a uniform draw
+    is below prob[k], otherwise take alias[k].
+    """
+    weights = np.asarray(weights, dtype=float)
+    n = len(weights)
+    scaled = weights * n / weights.sum()
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1]
+    large = [i for i in range(n) if scaled[i] >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+    # whatever is left is 1 up to rounding
+    return prob, alias
+
+class DropTable:
+    def __init__(self, items, table_chance, rules=(), collect=None, name=None):
+        self.name = name
+        self.items = dict(items)
+        self.table_chance = parse_chance(table_chance)
+        self.rules = list(rules)
+        self.collect = list(collect) if collect is not None else list(self.items)
+
+        for rule in self.rules:
+            if rule.get("type") not in RULE_TYPES:
+                raise ValueError(f"Unknown rule type {rule.get('type')!r}, expected one of {RULE_TYPES}")
+            if rule["type"] == "requires" and not ("item" in rule and "after" in rule):
+                raise ValueError(f"A requires rule needs 'item' and 'after': {rule}")
+        unknown = set(self.collect).union(*self._rule_items()) - set(self.items)
+        if unknown:
+            raise ValueError(f"Items not in the table: {sorted(unknown)}")
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a spec from .json, or .yaml/.yml (needs PyYAML)."""
+        path = Path(path)
+        if path.suffix in (".yaml", ".yml"):
+            import yaml
+            spec = yaml.safe_load(path.read_text())
+        else:
+            spec = json.loads(path.read_text())
+        return cls(spec["items"], spec["table_chance"], spec.get("rules", ()), spec.get("collect"), spec.get("name"))
+
+    def _rule_items(self):
+        for rule in self.rules:
+            yield set(rule.get("items", ())) | set(rule.get("after", ())) | ({rule["item"]} if "item" in rule else set())
+
+    def tracked_items(self):
+        """Items whose ownership matters: the collected ones and any a rule looks at."""
+        return frozenset(self.collect).union(*self._rule_items())
+
+    def eligible(self, owned):
+        """Items that can drop for a player who owns the items in owned, in table order."""
+        blocked = set()
+        for rule in self.rules:
+            if rule["type"] == "no_duplicates_until_complete":
+                if not all(item in owned for item in rule["items"]):
+                    blocked.update(item for item in rule["items"] if item in owned)
+            elif rule["type"] == "unique":
+                blocked.update(item for item in rule["items"] if item in owned)
+            elif not all(item in owned for item in rule["after"]):
+                blocked.add(rule["item"])
+        possible = [item for item in self.items if item not in blocked]
+        if not possible:
+            raise ValueError(f"No item can drop once {sorted(owned)} are owned")
+        return possible
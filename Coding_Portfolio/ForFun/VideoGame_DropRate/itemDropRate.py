@@ -1,6 +1,29 @@
+import argparse
 import random
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy import signal, sparse, stats
+from scipy.sparse.linalg import spsolve_triangular
+from drop_table import DropTable, alias_table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from accumulators import Histogram
+from montecarlo import run_monte_carlo
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+NOXIOUS = ["Noxious_blade", "Noxious_point", "Noxious_pommel"]
+
+DROP_WEIGHTS = {
+    "Noxious_blade": 3/4,
+    "Noxious_point": 3/4,
+    "Noxious_pommel": 3/4,
+    "Araxyte_fang": 1/4
+}
+
+TABLE_CHANCE = 1/150
 
 class Player:
     def __init__(self, name):
@@ -53,23 +76,209 @@ class Player:
             kills += 1
         return kills
 
-def simulate_multiple_players(num_players):
-    kills_list = []
-    for i in range(num_players):
-        player = Player(f"Player_{i+1}")
-        kills_list.append(player.simulate_until_all_drops())
-    return np.mean(kills_list), kills_list
-
-# Run simulation
-mean_kills, kills_data = simulate_multiple_players(100)
-print(f"Mean kills to get all unique drops (100 players): {mean_kills:.2f}")
-
-# Plot results
-plt.figure(figsize=(10,6))
-plt.hist(kills_data, bins=50, edgecolor='black')
-plt.title('Kills Needed to Get All Unique Drops')
-plt.xlabel('Number of Kills')
-plt.ylabel('Number of Players')
-plt.grid(True)
-plt.show()
+def possible_drops(owned):
+    """Player.get_possible_drops for a set of owned items."""
+    if all(item in owned for item in NOXIOUS):
+        return list(DROP_WEIGHTS)
+    return [item for item in NOXIOUS if item not in owned] + ["Araxyte_fang"]
+
+class DropChain:
+    """
+    The hunt for every unique drop as an absorbing Markov chain. A state is
+    the set of items owned so far; each table hit moves to the state with the
+    dropped item added, with probability proportional to its weight among the
+    items eligible in that state. Kills between hits are geometric with
+    success probability table_chance, so they never need to be rolled one by one.
+    Each state only leads to as many states as it has eligible items, so the
+    transitions are kept as a sparse matrix.
+    """
+    def __init__(self, weights=DROP_WEIGHTS, eligible=possible_drops, table_chance=TABLE_CHANCE, collect=None, tracked=None):
+        self.table_chance = table_chance
+        goal = frozenset(collect if collect is not None else weights)
+        # only ownership of these items changes what can drop or when the hunt ends
+        tracked = frozenset(tracked if tracked is not None else weights)
+
+        # breadth-first over reachable sets of owned items, with an alias
+        # table over the eligible items of each one for O(1) sampling
+        self.states = [frozenset()]
+        index = {frozenset(): 0}
+        tables = []
+        for i, owned in enumerate(self.states):
+            if goal <= owned:
+                tables.append(([1.0], [0], [i], [1.0]))
+                continue
+            possible = eligible(owned)
+            w = np.array([weights[item] for item in possible])
+            prob, alias = alias_table(w)
+            nexts = []
+            for item in possible:
+                nxt = owned | ({item} & tracked)
+                if nxt not in index:
+                    index[nxt] = len(self.states)
+                    self.states.append(nxt)
+                nexts.append(index[nxt])
+            tables.append((prob, alias, nexts, w / w.sum()))
+
+        # every hit keeps or adds items, so each state leads only to itself or
+        # later states; walking back from the end finds those that can still
+        # finish, and every item each one can still come to own
+        can_finish = [False] * len(self.states)
+        reachable = [None] * len(self.states)
+        for i in reversed(range(len(self.states))):
+            later = [j for j in tables[i][2] if j != i]
+            can_finish[i] = goal <= self.states[i] or any(can_finish[j] for j in later)
+            reachable[i] = self.states[i].union(*(reachable[j] for j in later))
+        if not all(can_finish):
+            i = can_finish.index(False)
+            blocked = goal - reachable[i] or goal - self.states[i]
+            raise ValueError(f"The hunt can never finish: once {sorted(self.states[i]) or 'nothing'} is owned, "
+                             f"{sorted(blocked)} can never all be collected")
+
+        n, width = len(self.states), max(len(t[0]) for t in tables)
+        self.alias_size = np.array([len(t[0]) for t in tables])
+        self.alias_prob = np.zeros((n, width))
+        self.alias_keep = np.zeros((n, width), dtype=np.intp)
+        self.alias_other = np.zeros((n, width), dtype=np.intp)
+        for i, (prob, alias, nexts, p) in enumerate(tables):
+            k = len(prob)
+            self.alias_prob[i, :k] = prob
+            self.alias_keep[i, :k] = nexts
+            self.alias_other[i, :k] = np.asarray(nexts)[alias]
+        # duplicate (row, column) entries, e.g. two items that both leave the state unchanged, are summed
+        rows = np.repeat(np.arange(n), [len(t[2]) for t in tables])
+        cols = np.concatenate([t[2] for t in tables])
+        probs = np.concatenate([t[3] for t in tables])
+        self.hit_matrix = sparse.csr_matrix((probs, (rows, cols)), shape=(n, n))
+        self.done = np.array([goal <= s for s in self.states])
+
+    @classmethod
+    def from_table(cls, table):
+        """Chain for a DropTable loaded from a JSON/YAML spec."""
+        return cls(table.items, table.eligible, table.table_chance, table.collect, table.tracked_items())
+
+    def expected_hits(self):
+        """Expected table hits to own every item, from an empty collection."""
+        transient = np.flatnonzero(~self.done)
+        q = self.hit_matrix[transient][:, transient]
+        # states are numbered breadth-first and a hit never removes an item,
+        # so every transition goes to the same or a later state: I - Q is upper triangular
+        hits = spsolve_triangular(sparse.identity(len(transient), format='csr') - q, np.ones(len(transient)), lower=False)
+        return hits[0]
+
+    def expected_kills(self):
+        """Exact expected kills: each hit takes 1/table_chance kills on average."""
+        return self.expected_hits() / self.table_chance
+
+    def hit_distribution(self, tail=1e-9):
+        """
+        Exact probability of finishing on table hit m, as an array indexed by
+        m, stopping once less than tail of the probability remains.
+        """
+        step = self.hit_matrix.T.tocsr()
+        dist = np.zeros(len(self.states))
+        dist[0] = 1
+        finished = [0.0]
+        while 1 - finished[-1] > tail:
+            dist = step @ dist
+            finished.append(dist[self.done].sum())
+        return np.diff(finished, prepend=0.0)
+
+    def kill_distribution(self, tail=1e-9):
+        """
+        Exact probability of finishing on kill n, as an array indexed by n,
+        stopping once less than tail of the probability remains. The kills
+        for m table hits are negative binomial, so this mixes those over
+        hit_distribution() instead of stepping the chain kill by kill.
+        """
+        p = self.table_chance
+        hits = self.hit_distribution(tail / 2)
+        # enough kills for the most hits to come in with all but tail / 2 probability
+        n = len(hits) + int(stats.nbinom.ppf(1 - tail / 2, len(hits) - 1, p))
+        kills = np.zeros(n)
+        kills[0] = 1
+        pmf = np.zeros(n)
+        for weight in hits[1:]:
+            # kills for one more hit: kills[n] = (1 - p) kills[n - 1] + p previous[n - 1]
+            kills = signal.lfilter([0, p], [1, p - 1], kills)
+            pmf += weight * kills
+        cdf = np.cumsum(pmf)
+        return pmf[:np.searchsorted(cdf, 1 - tail) + 1]
+
+    def simulate(self, n_players, rng=None):
+        """
+        Kills needed by each of n_players, simulated together: every round,
+        each unfinished player draws the kills until their next table hit
+        (geometric) and the item it gives (from the state's alias table).
+        """
+        rng = np.random.default_rng(rng)
+        state = np.zeros(n_players, dtype=np.intp)
+        kills = np.zeros(n_players, dtype=np.int64)
+        active = np.arange(n_players)
+        while active.size:
+            kills[active] += rng.geometric(self.table_chance, size=active.size)
+            s = state[active]
+            col = (rng.random(active.size) * self.alias_size[s]).astype(np.intp)
+            keep = rng.random(active.size) < self.alias_prob[s, col]
+            state[active] = np.where(keep, self.alias_keep[s, col], self.alias_other[s, col])
+            active = active[~self.done[state[active]]]
+        return kills
+
+def simulate_players(n, rng=None):
+    """
+    Kills needed by n Player objects, kill by kill. The random module is
+    seeded from rng first, so runs are reproducible under run_monte_carlo.
+    """
+    random.seed(int(np.random.default_rng(rng).integers(2 ** 63)))
+    return np.array([Player(f"Player_{i+1}").simulate_until_all_drops() for i in range(n)])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kills needed to collect every unique drop.")
+    parser.add_argument("--players", type=int, default=100, help="players to simulate (default 100)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--ci-width", type=float, default=None,
+                        help="stop early once the 95%% interval of the mean is this many kills wide")
+    parser.add_argument("--scalar", action="store_true", help="simulate kill by kill with the Player class")
+    parser.add_argument("--log-bins", action="store_true", help="histogram with logarithmic bins")
+    parser.add_argument("--table", metavar="SPEC",
+                        help="drop table spec (.json/.yaml, see drop_table.py); default is the built-in Araxxor table")
+    args = parser.parse_args()
+
+    if args.table and args.scalar:
+        parser.error("--scalar only simulates the built-in table")
+    chain = DropChain.from_table(DropTable.from_file(args.table)) if args.table else DropChain()
+
+    pmf = chain.kill_distribution()
+    cdf = np.cumsum(pmf)
+    # 50 bins up to the exact 99.9th percentile, or log bins from 10 kills to the 99.99th
+    if args.log_bins:
+        histogram = Histogram.log(10, np.searchsorted(cdf, 0.9999), 50)
+    else:
+        histogram = Histogram.linear(0, np.searchsorted(cdf, 0.999), 50)
+
+    # Run simulation
+    simulate, batch_size = (simulate_players, 1000) if args.scalar else (chain.simulate, 1_000_000)
+    summary = run_monte_carlo(simulate, args.players, batch_size, args.workers, args.seed, args.ci_width,
+                              histogram=histogram, quantiles=QUANTILES)
+    low, high = summary.ci()
+    print(f"Mean kills to get all unique drops ({summary.count} players): {summary.mean:.2f} "
+          f"(95% CI {low:.2f}-{high:.2f})")
+    quantiles = ", ".join(f"{q:.0%}: {summary.quantile(q):.0f}" for q in QUANTILES)
+    print(f"Simulated quantiles: {quantiles}")
+
+    quantiles = ", ".join(f"{q:.0%}: {np.searchsorted(cdf, q)}" for q in QUANTILES)
+    print(f"Exact expected kills: {chain.expected_kills():.2f} (quantiles {quantiles})")
 
+    # Plot results
+    fig, ax = plt.subplots(figsize=(10,6))
+    summary.histogram.plot(ax, edgecolor='black')
+    edges = summary.histogram.edges
+    exact = np.histogram(np.arange(len(pmf)), edges, weights=pmf)[0] * summary.count
+    ax.stairs(exact, edges, color='tab:red', linewidth=2, label='Exact')
+    ax.set_xlim(edges[0], edges[-1])
+    ax.legend()
+    ax.set_title('Kills Needed to Get All Unique Drops')
+    ax.set_xlabel('Number of Kills')
+    ax.set_ylabel('Number of Players')
+    ax.grid(True)
+    plt.show()
@@ -0,0 +1,206 @@
+"""
+Streaming summaries for simulations too large to keep every sample.
+
+Each accumulator takes samples in batches with update(), uses memory that
+does not grow with the number of samples, and can merge() another of the
+same kind, e.g. one filled by a different worker process.
+"""
+import copy
+import numpy as np
+
+class RunningStats:
+    """Count, mean, variance, min and max (Welford, batched with Chan et al.'s merge)."""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=float).ravel()
+        if not samples.size:
+            return
+        batch = RunningStats()
+        batch.count = samples.size
+        batch.mean = samples.mean()
+        batch.m2 = ((samples - batch.mean) ** 2).sum()
+        batch.min, batch.max = samples.min(), samples.max()
+        self.merge(batch)
+
+    def merge(self, other):
+        n = self.count + other.count
+        if n:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / n
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def ci(self, z=1.96):
+        """Normal-approximation confidence interval for the mean (z=1.96 for 95%)."""
+        half = z * np.sqrt(self.variance / self.count)
+        return self.mean - half, self.mean + half
+
+class Histogram:
+    """
+    Counts over fixed bin edges, plus the samples below and above them.
+    Histogram.linear and Histogram.log bin each sample with arithmetic
+    instead of a search over the edges.
+    """
+    def __init__(self, edges, scale=None):
+        self.edges = np.asarray(edges, dtype=float)
+        self.scale = scale
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    @classmethod
+    def linear(cls, low, high, bins):
+        return cls(np.linspace(low, high, bins + 1), "linear")
+
+    @classmethod
+    def log(cls, low, high, bins):
+        """Bins of equal width in log space; low must be positive."""
+        return cls(np.geomspace(low, high, bins + 1), "log")
+
+    def empty(self):
+        """A histogram with the same bins and no counts."""
+        return Histogram(self.edges, self.scale)
+
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=float).ravel()
+        low, high, bins = self.edges[0], self.edges[-1], len(self.counts)
+        below = samples < low
+        above = samples > high
+        self.below += int(below.sum())
+        self.above += int(above.sum())
+        inside = samples[~(below | above)]
+        if self.scale == "linear":
+            index = ((inside - low) * (bins / (high - low))).astype(np.intp)
+        elif self.scale == "log":
+            index = (np.log(inside / low) * (bins / np.log(high / low))).astype(np.intp)
+        else:
+            index = np.searchsorted(self.edges, inside, side="right") - 1
+        # the top edge belongs to the last bin, as in np.histogram
+        self.counts += np.bincount(np.minimum(index, bins - 1), minlength=bins)
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+
+    def plot(self, ax, **kwargs):
+        """Draw the counts as bars on a matplotlib Axes (log x axis for log bins)."""
+        ax.hist(self.edges[:-1], self.edges, weights=self.counts, **kwargs)
+        if self.scale == "log":
+            ax.set_xscale("log")
+
+class P2Quantile:
+    """
+    Streaming estimate of the p-quantile with Jain & Chlamtac's P² algorithm:
+    five markers (min, p/2, p, (1+p)/2, max) whose heights are nudged with a
+    piecewise-parabolic formula as samples arrive. Samples are taken in
+    chunks of about chunk_fraction of the count so far (one at a time at
+    first), so a run of 10^8 samples takes a couple of thousand vectorized
+    steps instead of a Python step per sample.
+    """
+    def __init__(self, p, chunk_fraction=0.01):
+        self.p = p
+        self.chunk_fraction = chunk_fraction
+        self.heights = np.zeros(5)
+        self.positions = np.arange(1.0, 6.0)
+        self.desired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+        self.initial = []
+
+    @property
+    def count(self):
+        return len(self.initial) if len(self.initial) < 5 else int(self.positions[4])
+
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=float).ravel()
+        if len(self.initial) < 5:
+            take = 5 - len(self.initial)
+            self.initial.extend(samples[:take])
+            samples = samples[take:]
+            if len(self.initial) < 5:
+                return
+            self.heights = np.sort(self.initial)
+        start = 0
+        while start < samples.size:
+            size = max(1, int(self.positions[4] * self.chunk_fraction))
+            self._update_chunk(np.sort(samples[start:start + size]))
+            start += size
+
+    def _update_chunk(self, chunk):
+        q, n = self.heights, self.positions
+        q[0] = min(q[0], chunk[0])
+        q[4] = max(q[4], chunk[-1])
+        # every sample below a marker pushes that marker's position up by one
+        n[1:4] += np.searchsorted(chunk, q[1:4], side="left")
+        n[4] += chunk.size
+        self.desired += chunk.size * self.increments
+
+        for i in (1, 2, 3):
+            while abs(self.desired[i] - n[i]) >= 1:
+                # at most half the gap to the neighbour it moves toward, so the
+                # parabola is only used close to where it was fitted
+                d = self.desired[i] - n[i]
+                j = i + (1 if d > 0 else -1)
+                limit = (abs(n[j] - n[i]) - 1) // 2 or abs(n[j] - n[i]) - 1
+                if limit < 1:
+                    break
+                step = int(np.sign(d) * min(np.trunc(abs(d)), limit))
+                parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + step * (q[j] - q[i]) / (n[j] - n[i])
+                n[i] += step
+
+    def merge(self, other):
+        """
+        Combine with a sketch of another sample. Each sketch's markers are read
+        as a piecewise-linear rank function; the merged markers are placed where
+        the sum of the two reaches the standard P² positions for the total count.
+        """
+        if other.count < 5:
+            self.update(other.initial)
+            return
+        if self.count < 5:
+            pending = self.initial
+            self.__dict__.update(copy.deepcopy(other.__dict__))
+            self.update(pending)
+            return
+
+        total = self.positions[4] + other.positions[4]
+        grid = np.union1d(self.heights, other.heights)
+        ranks = sum(np.where(grid >= sketch.heights[0], np.interp(grid, sketch.heights, sketch.positions), 0)
+                    for sketch in (self, other))
+        self.desired = 1 + (total - 1) * self.increments
+        positions = np.round(self.desired)
+        for i in (1, 2, 3):
+            positions[i] = min(max(positions[i], positions[i - 1] + 1), total - 4 + i)
+        self.positions = positions
+        self.heights = np.interp(positions, ranks, grid)
+
+    @property
+    def value(self):
+        """Current estimate of the p-quantile."""
+        if len(self.initial) < 5:
+            return float(np.quantile(self.initial, self.p)) if self.initial else float("nan")
+        return float(self.heights[2])
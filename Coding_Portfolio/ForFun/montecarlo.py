@@ -0,0 +1,108 @@
+"""
+Seeded, multi-core Monte Carlo runs for the ForFun simulators.
+
+A run is split into batches. Each batch gets its own random stream spawned
+from one SeedSequence, is simulated in a worker process, and comes back as a
+Summary (count, mean, variance, histogram, quantiles; see accumulators.py)
+rather than raw samples. Summaries are merged in batch order, so a seed
+gives the same result whatever the number of workers.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from accumulators import RunningStats, P2Quantile
+
+class Summary:
+    """
+    Running count, mean and variance of a sample, plus optionally a Histogram
+    (filled like the template given) and P² estimates of some quantiles.
+    Two summaries of disjoint samples merge into the summary of their union.
+    """
+    def __init__(self, histogram=None, quantiles=()):
+        self.stats = RunningStats()
+        self.histogram = None if histogram is None else histogram.empty()
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    def update(self, samples):
+        self.stats.update(samples)
+        if self.histogram is not None:
+            self.histogram.update(samples)
+        for sketch in self.quantiles.values():
+            sketch.update(samples)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        if self.histogram is not None:
+            self.histogram.merge(other.histogram)
+        for p, sketch in self.quantiles.items():
+            sketch.merge(other.quantiles[p])
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    @property
+    def variance(self):
+        return self.stats.variance
+
+    def ci(self, z=1.96):
+        return self.stats.ci(z)
+
+    def quantile(self, p):
+        return self.quantiles[p].value
+
+def _run_batch(simulate, n, seed, histogram, quantiles):
+    summary = Summary(histogram, quantiles)
+    summary.update(simulate(n, rng=np.random.default_rng(seed)))
+    return summary
+
+def run_monte_carlo(simulate, n_samples, batch_size=1_000_000, workers=None, seed=None,
+                    target_ci_width=None, z=1.96, histogram=None, quantiles=()):
+    """
+    Summary of up to n_samples draws of simulate(n, rng=Generator), which must
+    return an array of n samples and be picklable (a module-level function,
+    bound method or functools.partial). seed is an int or a SeedSequence.
+    Batches run across workers processes (workers=1 runs them in this
+    process). With target_ci_width, the run stops after the first batch at
+    which the confidence interval of the mean is at most that wide.
+    histogram (an accumulators.Histogram, used for its bins) and quantiles
+    (probabilities, e.g. (0.5, 0.99)) add those to the Summary.
+    """
+    sizes = [min(batch_size, n_samples - start) for start in range(0, n_samples, batch_size)]
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    total = Summary(histogram, quantiles)
+
+    def done():
+        if target_ci_width is None or total.count < 2:
+            return False
+        low, high = total.ci(z)
+        return high - low <= target_ci_width
+
+    if workers == 1:
+        for n, s in zip(sizes, seeds):
+            total.merge(_run_batch(simulate, n, s, histogram, quantiles))
+            if done():
+                break
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # keep a couple of batches per worker in flight, merge strictly in order
+        ahead = 2 * (workers or os.cpu_count())
+        pending = [pool.submit(_run_batch, simulate, n, s, histogram, quantiles) for n, s in zip(sizes[:ahead], seeds[:ahead])]
+        next_batch = len(pending)
+        while pending:
+            total.merge(pending.pop(0).result())
+            if done():
+                for future in pending:
+                    future.cancel()
+                break
+            if next_batch < len(sizes):
+                pending.append(pool.submit(_run_batch, simulate, sizes[next_batch], seeds[next_batch], histogram, quantiles))
+                next_batch += 1
+    return total
@@ -1,16 +1,13 @@
+import argparse
+import glob
+import io
+import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-
-df = pd.read_csv("PSQI.csv")
-
-psqi_cols = [col for col in df.columns if col.startswith("PSQI_")]
-df = df.dropna(subset=psqi_cols, how='all')
-
-# Data cleaning
-# number of minutes, remove question marks
-df['PSQI_002'] = pd.to_numeric(df['PSQI_002'].astype(str).str.replace(r'[a-zA-Z?()]', '', regex=True), errors='coerce')
-df['PSQI_004'] = pd.to_numeric(df['PSQI_004'].astype(str).str.replace(r'[a-zA-Z?()]', '', regex=True), errors='coerce')
+from pathlib import Path
+from table_io import PARQUET_SUFFIXES, TableWriter, column_names, read_table, write_table
 
 # Calculate Component Scores
 # 0 is good 3 is worse sleep score
@@ -26,11 +23,30 @@ Component 6: Use of Sleeping Medication
 Component 7: Daytime Dysfunction
 '''
 
-# Component 1 - Subjective Sleep Quality
+COMPONENT_COLS = [
+    'Component_1_Subjective_Sleep_Quality',
+    'Component_2_SleepLatency',
+    'Component_3_SleepDuration',
+    'Component_4_HabitualSleepEfficiency',
+    'Component_5_SleepDisturbances',
+    'Component_6_SleepingMedication',
+    'Component_7_DaytimeDysfunction',
+]
+
+DISTURBANCE_COLS = ['PSQI_006', 'PSQI_007', 'PSQI_008', 'PSQI_009', 'PSQI_010', 'PSQI_011', 'PSQI_012', 'PSQI_013', 'PSQI_015']
+
+# Numeric answer items; PSQI_014 is the free-text "other reason" and is left as-is
+ANSWER_COLS = ['PSQI_005'] + DISTURBANCE_COLS + ['PSQI_016', 'PSQI_017', 'PSQI_018', 'PSQI_019']
+
+TIME_FORMAT = '%I:%M:%S %p'
+
+DEFAULT_CHUNKSIZE = 100_000
 
-# PSQI_016, 0-3
-df['Component_1_Subjective_Sleep_Quality'] = pd.to_numeric(df['PSQI_016'], errors='coerce')
-df.loc[~df['Component_1_Subjective_Sleep_Quality'].between(0, 3, inclusive='both'), 'Component_1_Subjective_Sleep_Quality'] = pd.NA
+# Bump whenever the scoring rules change, so cached scores are thrown away
+SCORING_VERSION = 1
+
+# Row-wise scoring rules. score_psqi() below applies the same rules to whole
+# columns at once; these stay as the reference definition of each component.
 
 # Component 2- Sleep Latency
 
@@ -50,11 +66,6 @@ def score_latency_minutes(minutes):
     else:
         return 3
 
-df['PSQI_002_Score'] = df['PSQI_002'].apply(score_latency_minutes)
-df['PSQI_005'] = pd.to_numeric(df['PSQI_005'], errors='coerce')
-df.loc[~df['PSQI_005'].between(0, 3, inclusive='both'), 'PSQI_005'] = pd.NA
-df['Component_2_Sum'] = df[['PSQI_002_Score', 'PSQI_005']].sum(axis=1, skipna=False)
-
 # Assign component 2 score based on sum of PSQI_002 and PSQI_005
 # 0 = 0, 1-2 = 1, 3-4 = 2, 5-6 = 3
 def assign_component_2_score(total_sum):
@@ -69,17 +80,10 @@ def assign_component_2_score(total_sum):
     elif 5 <= total_sum <= 6:
         return 3
 
-df['Component_2_SleepLatency'] = df['Component_2_Sum'].apply(assign_component_2_score)
-
-# drop intermediate cols
-df.drop(columns=['PSQI_002_Score', 'Component_2_Sum'], inplace=True)
-
 # Component 3: Sleep Duration
 
 # PSQI_004
 # >= 7 hours = 0, 6-7 = 1, 5-6 hours = 2, < 5 = 3
-df['PSQI_004'] = pd.to_numeric(df['PSQI_004'], errors='coerce')
-
 def score_sleep_duration(hours):
     if pd.isna(hours):
         return pd.NA
@@ -92,8 +96,6 @@ def score_sleep_duration(hours):
     elif hours < 5:
         return 3
 
-df['Component_3_SleepDuration'] = df['PSQI_004'].apply(score_sleep_duration)
-
 # Component 4: Habitual Sleep Efficiency
 
 # PSQI_004 (hours of sleep)
@@ -106,21 +108,14 @@ def calculate_hours_in_bed(sleep_time, wake_time):
     if pd.isna(sleep_time) or pd.isna(wake_time):
         return pd.NA
     # Parse times using the correct format
-    sleep_time = datetime.strptime(sleep_time, '%I:%M:%S %p')
-    wake_time = datetime.strptime(wake_time, '%I:%M:%S %p')
+    sleep_time = datetime.strptime(sleep_time, TIME_FORMAT)
+    wake_time = datetime.strptime(wake_time, TIME_FORMAT)
     if wake_time <= sleep_time:
         wake_time += timedelta(days=1)
     # Calculate duration in hours
     duration = (wake_time - sleep_time).total_seconds() / 3600
     return duration
 
-# Apply the function to calculate Hours_in_Bed
-df['Hours_in_Bed'] = df.apply(lambda row: calculate_hours_in_bed(row['PSQI_001'], row['PSQI_003']), axis=1)
-
-# Calculate efficiency with cap at 100%
-df['Sleep_Efficiency_Pct'] = (df['PSQI_004'] / df['Hours_in_Bed']) * 100
-df['Sleep_Efficiency_Pct'] = df['Sleep_Efficiency_Pct'].apply(lambda x: min(x, 100) if x > 100 else x)
-
 def score_sleep_efficiency(efficiency):
     if pd.isna(efficiency):
         return pd.NA
@@ -133,16 +128,11 @@ def score_sleep_efficiency(efficiency):
     else:
         return 3
 
-df['Component_4_HabitualSleepEfficiency'] = df['Sleep_Efficiency_Pct'].apply(score_sleep_efficiency)
-df.drop(columns=['Sleep_Efficiency_Pct'], inplace=True)
-
 # Component 5: Step Disturbances
 # sum of PSQI_006, PSQI_007, PSQI_008, PSQI_009, PSQI_010, PSQI_0011
 # PSQI_012, PSQI_013, PSQI_015
 
 # Component 5 score: 0 = 0, 1-9 = 1, 10-18=2, 19-27 = 3
-df['Component_5_SleepDisturbances'] = df[['PSQI_006', 'PSQI_007', 'PSQI_008', 'PSQI_009', 'PSQI_010', 'PSQI_011', 'PSQI_012', 'PSQI_013', 'PSQI_015']].sum(axis=1)
-
 def score_step_disturbances(value):
     if pd.isna(value):
         return pd.NA
@@ -155,21 +145,15 @@ def score_step_disturbances(value):
     else:
         return 3
 
-df['Component_5_SleepDisturbances'] = df['Component_5_SleepDisturbances'].apply(score_step_disturbances)
-
 # Component 6: Use of Sleeping medication
 
 #PSQI_017, 0-3
-df['Component_6_SleepingMedication'] = df['PSQI_017']
 
 # Component 7: Daytime Dysfunction
 
 # Sum of: PSQI_018, 0-3; PSQI_019, 0-3
 # Component Score
 #0 = 0, 1-2 = 1, 3-4 = 2, 5-6 = 3
-
-df['Component_7_DaytimeDysfunction'] = df[['PSQI_018', 'PSQI_019']].sum(axis=1)
-
 def score_daytime_dysfunction(value):
     if pd.isna(value):
         return pd.NA
@@ -182,19 +166,377 @@ def score_daytime_dysfunction(value):
     else:
         return 3
 
-df['Component_7_DaytimeDysfunction'] = df['Component_7_DaytimeDysfunction'].apply(score_daytime_dysfunction)
-
-# Global Score is Sum of Components 1-7
-df['Global_Score'] = df[['Component_1_Subjective_Sleep_Quality',
-                         'Component_2_SleepLatency',
-                         'Component_3_SleepDuration',
-                         'Component_4_HabitualSleepEfficiency',
-                         'Component_5_SleepDisturbances',
-                         'Component_6_SleepingMedication',
-                         'Component_7_DaytimeDysfunction'
-                         ]].sum(axis=1, skipna=False)
-
-
-df.to_csv("PSQI_scored.csv", index = False)
-
+# Vectorized scoring
+
+def _score_bins(values, conditions, choices, default=np.nan):
+    """
+    np.select over a numeric Series. NA inputs, and values that fall through
+    every bin when default is NaN, come back as <NA> in an Int64 Series.
+    """
+    scored = np.select(conditions, choices, default=default).astype(float)
+    return pd.Series(scored, index=values.index).mask(values.isna()).astype('Int64')
+
+def calculate_hours_in_bed_vectorized(sleep_times, wake_times):
+    """
+    Column version of calculate_hours_in_bed. Missing times give NaN;
+    malformed times raise, as strptime does.
+    """
+    sleep_times = pd.to_datetime(sleep_times, format=TIME_FORMAT)
+    wake_times = pd.to_datetime(wake_times, format=TIME_FORMAT)
+    seconds = (wake_times - sleep_times).dt.total_seconds()
+    # wake time at or before sleep time means it is the next day; add the day
+    # before dividing, as calculate_hours_in_bed does, so the hours round the same
+    return seconds.mask(seconds <= 0, seconds + 86400) / 3600
+
+def _clean_answers(df):
+    """Drop rows with no PSQI_ answers and make the scored answers numeric."""
+    psqi_cols = [col for col in df.columns if col.startswith("PSQI_")]
+    df = df.dropna(subset=psqi_cols, how='all').copy()
+
+    # Data cleaning
+    # answers are read as text so every chunk of a file gets the same dtypes
+    for col in ANSWER_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+
+    # number of minutes, remove question marks
+    for col in ['PSQI_002', 'PSQI_004']:
+        df[col] = pd.to_numeric(df[col].astype(str).str.replace(r'[a-zA-Z?()]', '', regex=True), errors='coerce').astype(float)
+    return df
+
+def score_psqi(df):
+    """
+    Score all seven PSQI components and the global score for a DataFrame of
+    raw PSQI_ responses. Returns a new DataFrame with the same columns as
+    PSQI_scored.csv; rows with no PSQI_ answers at all are dropped.
+    """
+    df = _clean_answers(df)
+
+    # Component 1 - Subjective Sleep Quality
+    c1 = df['PSQI_016']
+    df['Component_1_Subjective_Sleep_Quality'] = c1.where(c1.between(0, 3, inclusive='both'))
+
+    # Component 2 - Sleep Latency
+    minutes = df['PSQI_002'].to_numpy(dtype=float)
+    latency_score = _score_bins(
+        df['PSQI_002'],
+        [minutes <= 15, (minutes >= 16) & (minutes <= 30), (minutes >= 31) & (minutes <= 60)],
+        [0, 1, 2],
+        default=3,
+    )
+    q5 = df['PSQI_005']
+    df['PSQI_005'] = q5.where(q5.between(0, 3, inclusive='both'))
+    total = latency_score.astype(float) + df['PSQI_005']
+    t = total.to_numpy()
+    df['Component_2_SleepLatency'] = _score_bins(
+        total,
+        [t == 0, (t >= 1) & (t <= 2), (t >= 3) & (t <= 4), (t >= 5) & (t <= 6)],
+        [0, 1, 2, 3],
+    )
+
+    # Component 3 - Sleep Duration
+    hours = df['PSQI_004'].to_numpy(dtype=float)
+    df['Component_3_SleepDuration'] = _score_bins(
+        df['PSQI_004'],
+        [hours >= 7, (hours >= 6) & (hours < 7), (hours >= 5) & (hours < 6), hours < 5],
+        [0, 1, 2, 3],
+    )
+
+    # Component 4 - Habitual Sleep Efficiency, capped at 100%
+    df['Hours_in_Bed'] = calculate_hours_in_bed_vectorized(df['PSQI_001'], df['PSQI_003'])
+    efficiency = (df['PSQI_004'] / df['Hours_in_Bed'] * 100).clip(upper=100)
+    e = efficiency.to_numpy()
+    df['Component_4_HabitualSleepEfficiency'] = _score_bins(
+        efficiency,
+        [e >= 85, (e >= 75) & (e < 85), (e >= 65) & (e < 75)],
+        [0, 1, 2],
+        default=3,
+    )
+
+    # Component 5 - Sleep Disturbances
+    disturbances = df[DISTURBANCE_COLS].sum(axis=1)
+    d = disturbances.to_numpy(dtype=float)
+    df['Component_5_SleepDisturbances'] = _score_bins(
+        disturbances,
+        [d == 0, (d >= 1) & (d <= 9), (d >= 10) & (d <= 18)],
+        [0, 1, 2],
+        default=3,
+    )
+
+    # Component 6 - Use of Sleeping medication
+    df['Component_6_SleepingMedication'] = df['PSQI_017']
+
+    # Component 7 - Daytime Dysfunction
+    dysfunction = df[['PSQI_018', 'PSQI_019']].sum(axis=1)
+    d = dysfunction.to_numpy(dtype=float)
+    df['Component_7_DaytimeDysfunction'] = _score_bins(
+        dysfunction,
+        [d == 0, (d >= 1) & (d <= 2), (d >= 3) & (d <= 4)],
+        [0, 1, 2],
+        default=3,
+    )
+
+    # Global Score is Sum of Components 1-7
+    df['Global_Score'] = df[COMPONENT_COLS].astype(float).sum(axis=1, skipna=False)
+    return df
+
+def score_psqi_rowwise(df):
+    """
+    score_psqi() as the original script did it, for parity_check(): the raw
+    answers go through pd.read_csv's own type inference, only PSQI_002,
+    PSQI_004, PSQI_005 and PSQI_016 are converted with pd.to_numeric, and
+    every rule is applied one value at a time. Slow; a reference only.
+    """
+    df = pd.read_csv(io.StringIO(df.to_csv(index=False)))
+    psqi_cols = [col for col in df.columns if col.startswith("PSQI_")]
+    df = df.dropna(subset=psqi_cols, how='all')
+    for col in ['PSQI_002', 'PSQI_004']:
+        df[col] = pd.to_numeric(df[col].astype(str).str.replace(r'[a-zA-Z?()]', '', regex=True), errors='coerce')
+
+    c1 = pd.to_numeric(df['PSQI_016'], errors='coerce')
+    df['Component_1_Subjective_Sleep_Quality'] = c1.where(c1.between(0, 3, inclusive='both'))
+    q5 = pd.to_numeric(df['PSQI_005'], errors='coerce')
+    df['PSQI_005'] = q5.where(q5.between(0, 3, inclusive='both'))
+    latency_score = df['PSQI_002'].apply(score_latency_minutes)
+    total = pd.concat([latency_score, df['PSQI_005']], axis=1).sum(axis=1, skipna=False)
+    df['Component_2_SleepLatency'] = total.apply(assign_component_2_score)
+    df['Component_3_SleepDuration'] = df['PSQI_004'].apply(score_sleep_duration)
+    df['Hours_in_Bed'] = df.apply(lambda row: calculate_hours_in_bed(row['PSQI_001'], row['PSQI_003']), axis=1)
+    efficiency = (df['PSQI_004'] / pd.to_numeric(df['Hours_in_Bed'])) * 100
+    efficiency = efficiency.apply(lambda x: min(x, 100) if x > 100 else x)
+    df['Component_4_HabitualSleepEfficiency'] = efficiency.apply(score_sleep_efficiency)
+    df['Component_5_SleepDisturbances'] = df[DISTURBANCE_COLS].sum(axis=1).apply(score_step_disturbances)
+    df['Component_6_SleepingMedication'] = df['PSQI_017']
+    df['Component_7_DaytimeDysfunction'] = df[['PSQI_018', 'PSQI_019']].sum(axis=1).apply(score_daytime_dysfunction)
+    # a fractional latency sum (PSQI_005 = 1.5) falls through every branch of
+    # assign_component_2_score and returns None, which made the original sum raise;
+    # it is counted as missing here
+    df[COMPONENT_COLS] = df[COMPONENT_COLS].astype('Float64')
+    df['Global_Score'] = df[COMPONENT_COLS].sum(axis=1, skipna=False)
+    return df
+
+def _edge_case_answers(n_rows=5000, seed=0):
+    """
+    Raw PSQI answers (as text, like read_psqi) drawn from the values where the
+    scoring rules change: bin boundaries, fractional minutes, hours and
+    answers, text around numbers, out-of-scale and missing answers, equal and
+    wrap-around bed/wake times. Columns the original script summed without
+    pd.to_numeric only get numbers, as text there would break it.
+    """
+    rng = np.random.default_rng(seed)
+    choices = {
+        'PSQI_001': ['10:00:00 PM', '08:13:00 PM', '11:59:30 PM', '12:00:00 AM', '01:30:00 AM', '06:00:00 AM', None],
+        'PSQI_002': ['0', '15', '15.5', '16', '30', '30.5', '31', '60', '60.5', '61', '20 min?', '(45)', 'abc', None],
+        'PSQI_003': ['06:00:00 AM', '02:53:00 AM', '10:00:00 PM', '12:00:00 AM', '07:45:15 AM', '12:00:00 PM', None],
+        'PSQI_004': ['4.99', '5', '5.5', '6', '6.99', '7', '7.5', '8', '24', '7 hrs', '?', None],
+        'PSQI_005': ['0', '1', '2', '3', '4', '-1', '1.5', None],
+        'PSQI_016': ['0', '1', '2', '3', '4', '2.0', None],
+        'PSQI_017': ['0', '1', '2', '3', '0.5', '2.5', '4', '-1', None],
+    }
+    for col in DISTURBANCE_COLS + ['PSQI_018', 'PSQI_019']:
+        choices[col] = ['0', '1', '2', '3', '0.5', '1.5', '4', '-1', None]
+    df = pd.DataFrame({col: rng.choice(np.array(values, dtype=object), n_rows) for col, values in choices.items()})
+    # efficiency exactly at the 75% boundary, which rounds differently if the day is added after dividing
+    df.loc[0, ['PSQI_001', 'PSQI_003', 'PSQI_004']] = ['08:13:00 PM', '02:53:00 AM', '5']
+    return df
+
+def parity_check(n_rows=5000, seed=0):
+    """
+    Score edge-case answers with score_psqi() and score_psqi_rowwise() and
+    compare every component, Hours_in_Bed and Global_Score exactly. Returns
+    True if they all agree.
+    """
+    raw = _edge_case_answers(n_rows, seed)
+    vectorized, rowwise = score_psqi(raw), score_psqi_rowwise(raw)
+    ok = True
+    for col in COMPONENT_COLS + ['Hours_in_Bed', 'Global_Score']:
+        a = vectorized[col].astype('Float64').to_numpy(dtype=float, na_value=np.nan)
+        b = rowwise[col].astype('Float64').to_numpy(dtype=float, na_value=np.nan)
+        same = (a == b) | (np.isnan(a) & np.isnan(b))
+        ok &= bool(same.all())
+        print(f"{col}: {'ok' if same.all() else f'{(~same).sum()} of {len(same)} rows differ'}")
+    return ok
+
+def read_psqi(input_file, chunksize=None, id_cols=None):
+    """
+    Read a PSQI export (CSV or Parquet). CSV columns are read as text, so that
+    dtypes do not depend on which rows end up in which chunk. With id_cols,
+    only the PSQI_ columns and those identifier columns are read.
+    """
+    columns = None
+    if id_cols is not None:
+        columns = lambda c: c.startswith("PSQI_") or c in id_cols
+    return read_table(input_file, columns=columns, dtype=str, chunksize=chunksize)
+
+def score_psqi_file(input_file, output_file, chunksize=None, id_cols=None):
+    """
+    Score input_file and write the result to output_file, as CSV or Parquet
+    depending on the extensions. With a chunksize, rows are read, scored and
+    appended one chunk at a time so peak memory is bounded by the chunk size;
+    the output is the same either way.
+    """
+    if chunksize is None:
+        write_table(score_psqi(read_psqi(input_file, id_cols=id_cols)), output_file, whole_as_int=True)
+        return
+
+    with TableWriter(output_file, whole_as_int=True) as writer:
+        wrote = False
+        for chunk in read_psqi(input_file, chunksize=chunksize, id_cols=id_cols):
+            writer.write(score_psqi(chunk))
+            wrote = True
+        if not wrote:
+            # no data rows at all, still write the column names
+            writer.write(score_psqi(read_psqi(input_file, id_cols=id_cols)))
+
+def load_score_cache(cache_file, psqi_cols):
+    """
+    Cached scores from an earlier incremental run, indexed by row hash. The
+    cache is discarded if it was written by other scoring rules or for a
+    different set of PSQI_ columns.
+    """
+    if cache_file and os.path.exists(cache_file):
+        cache = pd.read_pickle(cache_file)
+        if cache["version"] == SCORING_VERSION and cache["psqi_cols"] == psqi_cols:
+            return cache["scores"]
+    return None
+
+def score_psqi_incremental(input_file, output_file, cache_file, id_cols=None):
+    """
+    Score input_file like score_psqi_file, but only score rows whose PSQI_
+    answers are not already in cache_file. Rows are keyed by a hash of their
+    PSQI_ columns; the cache is rewritten with the scores of the current rows.
+    Returns the number of rows that had to be scored.
+    """
+    df = read_psqi(input_file, id_cols=id_cols)
+    psqi_cols = [col for col in df.columns if col.startswith("PSQI_")]
+    df = df.dropna(subset=psqi_cols, how='all')
+    keys = pd.util.hash_pandas_object(df[psqi_cols], index=False)
+
+    cached = load_score_cache(cache_file, psqi_cols)
+    if cached is None:
+        new = pd.Series(True, index=df.index)
+    else:
+        new = ~keys.isin(cached.index)
+
+    scored = score_psqi(df.loc[new, psqi_cols]).set_axis(keys[new])
+    if cached is not None:
+        scored = pd.concat([cached, scored])
+    scored = scored[~scored.index.duplicated()]
+    scored = scored.loc[scored.index.isin(keys)]
+
+    # PSQI_ and score columns come from the cache, everything else from the input
+    rows = scored.loc[keys].set_axis(df.index)
+    score_cols = [col for col in scored.columns if col not in psqi_cols]
+    out = pd.concat([df.drop(columns=psqi_cols), rows], axis=1)[list(df.columns) + score_cols]
+    write_table(out, output_file, whole_as_int=True)
+
+    pd.to_pickle({"version": SCORING_VERSION, "psqi_cols": psqi_cols, "scores": scored}, cache_file)
+    print(f"Scored {int(new.sum())} new or changed rows, {int((~new).sum())} from cache")
+    return int(new.sum())
+
+def scored_path(input_file):
+    """PSQI.csv -> PSQI_scored.csv, next to the input file."""
+    path = Path(input_file)
+    return str(path.with_name(f"{path.stem}_scored{path.suffix}"))
+
+def find_psqi_files(path_or_glob, combined_file=None):
+    """
+    Input files for a batch run: every .csv/.parquet under a directory, or
+    every match of a glob pattern. Outputs from earlier runs are skipped:
+    <name>_scored files, combined_file, and any file that already has a
+    source_file column (a combined file written under another name).
+    """
+    if os.path.isdir(path_or_glob):
+        suffixes = (".csv",) + PARQUET_SUFFIXES
+        files = [str(p) for p in Path(path_or_glob).rglob("*") if p.suffix.lower() in suffixes]
+    else:
+        files = glob.glob(path_or_glob, recursive=True)
+    combined = Path(combined_file).resolve() if combined_file else None
+    inputs = []
+    for f in sorted(files):
+        if Path(f).stem.endswith("_scored") or Path(f).resolve() == combined:
+            continue
+        if "source_file" in column_names(f):
+            print(f"Skipping {f}: already has a source_file column")
+            continue
+        inputs.append(f)
+    return inputs
+
+def score_psqi_files(path_or_glob, combined_file=None, workers=None, chunksize=None, id_cols=None):
+    """
+    Score every file matched by path_or_glob across a process pool, writing
+    <name>_scored.csv beside each input. If combined_file is given, the scored
+    rows of all files are also written there with a source_file column.
+    Returns the list of scored output paths.
+    """
+    files = find_psqi_files(path_or_glob, combined_file)
+    if not files:
+        print(f"No PSQI files found for {path_or_glob}")
+        return []
+
+    outputs = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(score_psqi_file, f, scored_path(f), chunksize, id_cols): f
+            for f in files
+        }
+        for future in as_completed(futures):
+            input_file = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Failed to score {input_file}: {e}")
+                continue
+            outputs[input_file] = scored_path(input_file)
+            print(f"Scored {input_file}: {outputs[input_file]}")
+
+    if combined_file and outputs:
+        frames = []
+        for input_file in files:
+            if input_file in outputs:
+                scored = read_table(outputs[input_file], dtype=str)
+                scored.insert(0, "source_file", input_file)
+                frames.append(scored)
+        write_table(pd.concat(frames, ignore_index=True), combined_file, whole_as_int=True)
+        print(f"Combined {len(frames)} files: {combined_file}")
+
+    return [outputs[f] for f in files if f in outputs]
+
+def main():
+    parser = argparse.ArgumentParser(description="Score PSQI survey responses (CSV or Parquet).")
+    parser.add_argument("input_file", nargs="?", default="PSQI.csv")
+    parser.add_argument("output_file", nargs="?", default="PSQI_scored.csv")
+    parser.add_argument("--id-cols", nargs="+", metavar="COL",
+                        help="only read the PSQI_ columns plus these identifier columns")
+    parser.add_argument("--stream", action="store_true",
+                        help="read, score and write the file in chunks")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"rows per chunk with --stream (default {DEFAULT_CHUNKSIZE})")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="incremental mode: only score rows not already in this cache")
+    parser.add_argument("--batch", metavar="GLOB_OR_DIR",
+                        help="score every matching file into <name>_scored.csv beside it")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for --batch (default: all cores)")
+    parser.add_argument("--combined", metavar="FILE",
+                        help="with --batch, also write all scored rows to one file")
+    parser.add_argument("--check", action="store_true",
+                        help="compare the vectorized and row-wise scoring on edge cases and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if parity_check() else 1)
+
+    if args.cache and (args.batch or args.stream):
+        parser.error("--cache cannot be combined with --batch or --stream")
+
+    chunksize = args.chunksize if args.stream else None
+    if args.cache:
+        score_psqi_incremental(args.input_file, args.output_file, args.cache, id_cols=args.id_cols)
+    elif args.batch:
+        score_psqi_files(args.batch, combined_file=args.combined, workers=args.workers,
+                         chunksize=chunksize, id_cols=args.id_cols)
+    else:
+        score_psqi_file(args.input_file, args.output_file, chunksize=chunksize, id_cols=args.id_cols)
 
+if __name__ == "__main__":
+    main()
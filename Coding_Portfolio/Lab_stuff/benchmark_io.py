@@ -0,0 +1,77 @@
+"""
+Time the CSV and Parquet paths of PSQI_score.py and demo_pivot.py on
+synthetic data of a given size.
+
+    python benchmark_io.py --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import demo_pivot
+import PSQI_score
+
+def make_psqi(n, rng):
+    def clock_times():
+        hours = rng.integers(1, 13, n)
+        minutes = rng.choice([0, 15, 30, 45], n)
+        ampm = rng.choice(["AM", "PM"], n)
+        return [f"{h}:{m:02d}:00 {p}" for h, m, p in zip(hours, minutes, ampm)]
+
+    df = pd.DataFrame({"RecordID": np.arange(n)})
+    df["PSQI_001"] = clock_times()
+    df["PSQI_002"] = rng.choice(["10", "20 min", "45", "(60)", "90?"], n)
+    df["PSQI_003"] = clock_times()
+    df["PSQI_004"] = rng.choice(["4", "5.5", "6", "7 hours", "8"], n)
+    for i in range(5, 20):
+        df[f"PSQI_{i:03d}"] = rng.integers(0, 4, n).astype(str)
+    df["PSQI_014"] = rng.choice(["", "noise", "pets"], n)
+    return df
+
+def make_demographics(n, rng):
+    df = pd.DataFrame({
+        "RecordID": np.arange(n),
+        "Sex": rng.choice(["M", "F"], n),
+        "Race": rng.choice(list(demo_pivot.race_map), n),
+        "EthnicityRaw": rng.choice(["N", "Y", "Unknown"], n),
+    })
+    # columns the pivot never uses, as in a real enrollment export
+    for i in range(10):
+        df[f"Extra_{i}"] = rng.choice(["lorem ipsum dolor", "sit amet", ""], n)
+    return df
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    print(f"  {label:<28}{time.perf_counter() - start:8.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for name, df in [("PSQI", make_psqi(args.rows, rng)), ("demographics", make_demographics(args.rows, rng))]:
+            df.to_csv(tmp / f"{name}.csv", index=False)
+            df.to_parquet(tmp / f"{name}.parquet", index=False)
+
+        print(f"PSQI scoring, {args.rows:,} rows")
+        for ext in ["csv", "parquet"]:
+            timed(f"read {ext}", lambda: PSQI_score.read_psqi(tmp / f"PSQI.{ext}"))
+            timed(f"read + score + write {ext}",
+                  lambda: PSQI_score.score_psqi_file(tmp / f"PSQI.{ext}", tmp / f"PSQI_scored.{ext}"))
+
+        print(f"Demographics pivot, {args.rows:,} rows")
+        for ext in ["csv", "parquet"]:
+            timed(f"read {ext}", lambda: demo_pivot.load_demographics(tmp / f"demographics.{ext}"))
+            timed(f"read + pivot {ext}",
+                  lambda: demo_pivot.build_pivot(demo_pivot.clean_demographics(
+                      demo_pivot.load_demographics(tmp / f"demographics.{ext}"))))
+
+if __name__ == "__main__":
+    main()
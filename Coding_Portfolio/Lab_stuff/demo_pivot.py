@@ -1,11 +1,12 @@
+import argparse
+import json
+import os
+import numpy as np
 import pandas as pd
+from table_io import read_table, write_table
 
-# Load data
-df = pd.read_csv("demographics.csv")
-
-# Clean and normalize columns
-for col in ['Sex', 'Race', 'EthnicityRaw']:
-    df[col] = df[col].fillna('Unknown').str.strip()
+# Only these columns are read from the input file
+DEMOGRAPHIC_COLS = ['RecordID', 'Sex', 'Race', 'EthnicityRaw']
 
 race_map = {
     'AI/AN': 'American Indian/Alaska Native',
@@ -20,30 +21,13 @@ race_map = {
     'Unknown': 'Unknown',
     'Black or African American': 'Black or African American',
 }
-df['Race'] = df['Race'].replace(race_map)
 
 ethnicity_map = {
     'N': 'Not Hispanic or Latino',
     'Y': 'Hispanic or Latino',
     'Unknown': 'Unknown'
 }
-df['Ethnicity'] = df['EthnicityRaw'].map(ethnicity_map).fillna('Unknown')
-
-# Create pivot table
-pivot = pd.pivot_table(
-    df,
-    index='Race',
-    columns=['Ethnicity', 'Sex'],
-    values='RecordID',
-    aggfunc='count',
-    fill_value=0
-)
-
-# Add totals
-pivot[('Total', 'Total')] = pivot.sum(axis=1)
-pivot.loc['Total'] = pivot.sum()
-
-# Reorder rows and columns
+
 preferred_order = [
     'American Indian/Alaska Native',
     'Asian',
@@ -55,18 +39,184 @@ preferred_order = [
     'Unknown',
     'Total'
 ]
-pivot = pivot.reindex(preferred_order)
 
-cols = list(pivot.columns)
-cols_no_total = [c for c in cols if c != ('Total', 'Total')]
-cols_no_total_sorted = sorted(cols_no_total)
-ordered_columns = cols_no_total_sorted + [('Total', 'Total')]
-pivot = pivot[ordered_columns]
+def load_demographics(input_file, extra_cols=()):
+    """Read the demographics columns (plus extra_cols) from a CSV or Parquet file."""
+    return read_table(input_file, columns=DEMOGRAPHIC_COLS + list(extra_cols))
+
+# Fixed category orders for the pivot. Races outside race_levels still count
+# towards the totals (as 'Unlisted') but do not get a row of their own.
+race_levels = preferred_order[:-1]
+unlisted_race = 'Unlisted'
+ethnicity_levels = sorted(set(ethnicity_map.values()))
+
+def _clean(value):
+    # fillna('Unknown').str.strip() for a single value
+    if pd.isna(value):
+        return 'Unknown'
+    return value.strip() if isinstance(value, str) else np.nan
+
+def _to_categorical(values, clean, categories):
+    """
+    Categorical of clean(value) with fixed categories. clean runs once per
+    distinct value rather than once per row; results outside categories are NaN.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    categories = pd.Index(categories)
+    unique_codes = categories.get_indexer([clean(u) for u in uniques])
+    return pd.Categorical.from_codes(unique_codes[codes], categories=categories)
+
+def _clean_race(value):
+    race = _clean(value)
+    race = race_map.get(race, race)
+    return race if race in race_levels else unlisted_race
+
+def _clean_ethnicity(value):
+    return ethnicity_map.get(_clean(value), 'Unknown')
+
+def clean_demographics(df):
+    """
+    Normalize Race, Ethnicity and Sex into categoricals with fixed category
+    orders: preferred_order for race, the ethnicity_map labels for ethnicity,
+    and the sorted distinct cleaned values for sex.
+    """
+    df = df.copy()
+    sex_levels = sorted({_clean(v) for v in df['Sex'].unique()} - {np.nan})
+    df['Sex'] = _to_categorical(df['Sex'], _clean, sex_levels)
+    df['Race'] = _to_categorical(df['Race'], _clean_race, race_levels + [unlisted_race])
+    df['Ethnicity'] = _to_categorical(df['EthnicityRaw'], _clean_ethnicity, ethnicity_levels)
+    return df
+
+def count_records(df, by=()):
+    """
+    Records with a RecordID, counted per (*by, Race, Ethnicity, Sex). Only
+    combinations that occur are kept; missing values in by are kept as a group.
+    """
+    counted = df[df['RecordID'].notna()]
+    return counted.groupby(list(by) + ['Race', 'Ethnicity', 'Sex'], observed=True, dropna=False).size()
+
+def _counts_to_table(counts, sex_levels):
+    """Race x (Ethnicity, Sex) table with totals from counts indexed by (Race, Ethnicity, Sex)."""
+    races = race_levels + [unlisted_race]
+    columns = pd.MultiIndex.from_product([ethnicity_levels, sex_levels], names=['Ethnicity', 'Sex'])
+    full_index = pd.MultiIndex.from_product([races, ethnicity_levels, sex_levels])
+    counts = counts.reindex(full_index, fill_value=0).to_numpy().reshape(len(races), len(columns))
+
+    # Add totals; the column totals include unlisted races
+    table = np.vstack([counts[:len(race_levels)], counts.sum(axis=0)])
+    table = np.column_stack([table, table.sum(axis=1)])
+
+    return pd.DataFrame(
+        table,
+        index=pd.Index(preferred_order, name='Race'),
+        columns=pd.MultiIndex.from_tuples(list(columns) + [('Total', 'Total')], names=columns.names),
+    )
+
+def build_pivot(df):
+    """
+    Race x (Ethnicity, Sex) record counts with totals, from one groupby over
+    the categorical columns. Every race and ethnicity/sex pair gets a cell,
+    with 0 where no records fall.
+    """
+    return _counts_to_table(count_records(df), list(df['Sex'].cat.categories))
+
+class DemographicsReport:
+    """
+    Cleans a demographics table once and counts it once over every configured
+    dimension, so any number of pivots can be rolled up from the cached counts
+    without touching the records again.
+
+    dimensions are extra columns to cut by (e.g. Site, Arm). periods maps a new
+    dimension name to (date column, pandas period frequency), e.g.
+    {'EnrollQuarter': ('EnrollDate', 'Q')}.
+    """
+    def __init__(self, df, dimensions=(), periods=None):
+        periods = periods or {}
+        df = clean_demographics(df)
+        for name, (column, freq) in periods.items():
+            df[name] = pd.to_datetime(df[column], errors='coerce').dt.to_period(freq).astype(str)
+
+        self.dimensions = list(dimensions) + list(periods)
+        self.sex_levels = list(df['Sex'].cat.categories)
+        self.total_records = len(df)
+        self.counts = count_records(df, self.dimensions)
+
+    @classmethod
+    def from_file(cls, input_file, dimensions=(), periods=None):
+        date_cols = [column for column, _ in (periods or {}).values()]
+        extra_cols = list(dict.fromkeys(list(dimensions) + date_cols))
+        return cls(load_demographics(input_file, extra_cols), dimensions, periods)
+
+    def pivot(self, by=()):
+        """
+        Race x (Ethnicity, Sex) table with totals. With by (a dimension name or
+        a list of them) there is one table per group, stacked under the by
+        values as extra row index levels.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        unknown = [dim for dim in by if dim not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Not a report dimension: {unknown} (available: {self.dimensions})")
+
+        counts = self.counts.groupby(level=by + ['Race', 'Ethnicity', 'Sex'], observed=True, dropna=False).sum()
+        if not by:
+            return _counts_to_table(counts, self.sex_levels)
+        tables = []
+        for key, group in counts.groupby(level=by if len(by) > 1 else by[0], dropna=False):
+            key = key if isinstance(key, tuple) else (key,)
+            table = _counts_to_table(group.droplevel(by), self.sex_levels)
+            # index built directly rather than from pd.concat keys, which cannot hold a missing by value
+            table.index = pd.MultiIndex.from_tuples([(*key, race) for race in table.index], names=by + ['Race'])
+            tables.append(table)
+        return pd.concat(tables)
+
+def run_reports(input_file, config_file):
+    """
+    Write every report listed in a JSON config, e.g.
+
+        {
+          "output_dir": "reports",
+          "dimensions": ["Site", "Arm"],
+          "periods": {"EnrollQuarter": {"column": "EnrollDate", "freq": "Q"}},
+          "reports": [
+            {"name": "overall"},
+            {"name": "by_site", "by": "Site"},
+            {"name": "by_arm_quarter", "by": ["Arm", "EnrollQuarter"], "format": "parquet"}
+          ]
+        }
+    """
+    with open(config_file) as f:
+        cfg = json.load(f)
+
+    periods = {name: (p["column"], p["freq"]) for name, p in cfg.get("periods", {}).items()}
+    report = DemographicsReport.from_file(input_file, cfg.get("dimensions", []), periods)
+
+    output_dir = cfg.get("output_dir", ".")
+    os.makedirs(output_dir, exist_ok=True)
+    for spec in cfg["reports"]:
+        output_file = os.path.join(output_dir, f"{spec['name']}.{spec.get('format', 'csv')}")
+        write_table(report.pivot(spec.get("by", ())), output_file, index=True)
+        print(f"Wrote {spec['name']}: {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Race x (Ethnicity, Sex) enrollment table.")
+    parser.add_argument("input_file", nargs="?", default="demographics.csv")
+    parser.add_argument("output_file", nargs="?", default="demographics_summary.csv")
+    parser.add_argument("--report", metavar="CONFIG",
+                        help="write the reports listed in this JSON config instead of one table")
+    args = parser.parse_args()
 
-pivot.to_csv("demographics_summary.csv")
+    if args.report:
+        run_reports(args.input_file, args.report)
+        return
 
-# Check totals
-print(f"Total records: {len(df)}")
-print(f"Pivot total: {pivot.loc['Total', ('Total', 'Total')]}")
+    df = clean_demographics(load_demographics(args.input_file))
+    pivot = build_pivot(df)
+    write_table(pivot, args.output_file, index=True)
 
+    # Check totals
+    print(f"Total records: {len(df)}")
+    print(f"Pivot total: {pivot.loc['Total', ('Total', 'Total')]}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+CSV/Parquet reading and writing shared by the lab scripts.
+
+The format is picked from the file extension (.parquet/.pq, anything else is
+CSV). pyarrow is only imported when a Parquet file is actually used.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+def is_parquet(path):
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES
+
+def _project(names, columns):
+    """Resolve columns (None, a list, or a callable on the name) against names."""
+    if columns is None:
+        return None
+    if callable(columns):
+        return [name for name in names if columns(name)]
+    return [name for name in names if name in columns]
+
+def column_names(path):
+    """Column names of a CSV or Parquet file, without reading its rows."""
+    if not is_parquet(path):
+        return list(pd.read_csv(path, nrows=0).columns)
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).schema_arrow.names
+
+def read_table(path, columns=None, dtype=None, chunksize=None):
+    """
+    Read a CSV or Parquet file, keeping only the requested columns.
+
+    columns may be a list of names or a callable taking a column name, as with
+    pd.read_csv(usecols=...). dtype only applies to CSV; Parquet keeps its
+    stored types. With a chunksize an iterator of DataFrames is returned.
+    """
+    if not is_parquet(path):
+        usecols = columns if columns is None or callable(columns) else lambda c: c in columns
+        return pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    names = _project(parquet_file.schema_arrow.names, columns)
+    if chunksize is None:
+        return parquet_file.read(columns=names).to_pandas()
+    return (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunksize, columns=names))
+
+def _arrow_schema(df):
+    """Arrow schema for df, with all-missing text columns typed as strings."""
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+def _whole_floats_as_int(df):
+    """
+    df with the whole values of float columns as ints, so a CSV shows 2
+    rather than 2.0; other values, and so the numbers read back, are unchanged.
+    """
+    df = df.copy()
+    for col in df.columns[[pd.api.types.is_float_dtype(t) for t in df.dtypes]]:
+        values = df[col].astype(float)
+        whole = (values % 1 == 0) & (values.abs() < 2 ** 53)
+        if whole.any():
+            column = values.astype(object)
+            column[whole] = values[whole].astype(np.int64)
+            df[col] = column
+    return df
+
+class TableWriter:
+    """
+    Append DataFrames chunk by chunk to one CSV or Parquet file. The first
+    chunk fixes the header (CSV) or schema (Parquet). With whole_as_int,
+    whole float values are written to CSV as ints (see _whole_floats_as_int()), one
+    value at a time so chunks never disagree.
+    """
+    def __init__(self, path, whole_as_int=False):
+        self.path = path
+        self.whole_as_int = whole_as_int
+        self._file = None
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                self._schema = _arrow_schema(df)
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="")
+            if self.whole_as_int:
+                df = _whole_floats_as_int(df)
+            df.to_csv(self._file, index=False, header=header)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_table(df, path, index=False, whole_as_int=False):
+    """
+    Write df to CSV or Parquet based on the extension of path. whole_as_int
+    writes whole float values to CSV as ints; Parquet keeps the float type.
+    """
+    if is_parquet(path):
+        df.to_parquet(path, index=index)
+    else:
+        (_whole_floats_as_int(df) if whole_as_int else df).to_csv(path, index=index)